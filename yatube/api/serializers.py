@@ -0,0 +1,40 @@
+"""Преобразование моделей в словари для JSON с выбором полей.
+
+Клиент может запросить только нужные поля: ?fields=id,text,author.
+"""
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group else None,
+    'image': lambda post: post.image.url if post.image else None,
+}
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'parent': lambda comment: comment.parent_id,
+    'depth': lambda comment: comment.depth,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created.isoformat(),
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def parse_fields(value, available):
+    """Список полей из ?fields=; без параметра — все поля."""
+    if not value:
+        return list(available)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise FieldsError(f'Неизвестные поля: {", ".join(unknown)}')
+    return fields
+
+
+def serialize(obj, fields, available):
+    return {field: available[field](obj) for field in fields}
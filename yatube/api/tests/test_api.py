@@ -0,0 +1,215 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.views import POSTS_IN_PAGE
+
+User = get_user_model()
+
+
+class ApiFeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='api_author')
+        cls.group = Group.objects.create(title='Группа', slug='api_group')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            for i in range(POSTS_IN_PAGE + 3)
+        ]
+        cls.posts.reverse()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_walk_with_cursor(self):
+        urls = [
+            reverse('api:index'),
+            reverse('api:group_posts', args=[self.group.slug]),
+            reverse('api:profile', args=[self.author.username]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).json()
+                self.assertEqual(
+                    [post['id'] for post in first['results']],
+                    [post.pk for post in self.posts[:POSTS_IN_PAGE]],
+                )
+                second = self.client.get(
+                    url, {'cursor': first['next_cursor']}
+                ).json()
+                self.assertEqual(
+                    [post['id'] for post in second['results']],
+                    [post.pk for post in self.posts[POSTS_IN_PAGE:]],
+                )
+                self.assertIsNone(second['next_cursor'])
+
+    def test_sparse_fields(self):
+        data = self.client.get(
+            reverse('api:index'), {'fields': 'id,author'}
+        ).json()
+        self.assertEqual(
+            data['results'][0],
+            {'id': self.posts[0].pk, 'author': self.author.username},
+        )
+        response = self.client.get(reverse('api:index'), {'fields': 'secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_feed_is_not_modified(self):
+        url = reverse('api:group_posts', args=[self.group.slug])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.client.force_login(self.author)
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Новый', 'group': self.group.pk,
+        })
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def assertWriteChangesEtags(self, urls, write):
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        write()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_orm_writes_change_etags(self):
+        """Посты, сохранённые в обход views, тоже меняют ETag лент."""
+        other_group = Group.objects.create(title='Другая', slug='api_other')
+        urls = [
+            reverse('api:index'),
+            reverse('api:group_posts', args=[self.group.slug]),
+            reverse('api:group_posts', args=[other_group.slug]),
+            reverse('api:profile', args=[self.author.username]),
+        ]
+        post = Post(text='Из shell', author=self.author, group=self.group)
+        self.assertWriteChangesEtags(urls[:2] + urls[3:], post.save)
+
+        def move():
+            post.group = other_group
+            post.save()
+
+        self.assertWriteChangesEtags(urls, move)
+        self.assertWriteChangesEtags(urls[:1] + urls[2:], post.delete)
+
+    def test_renames_change_etags(self):
+        post = self.posts[0]
+        urls = [
+            reverse('api:index'),
+            reverse('api:group_posts', args=[self.group.slug]),
+            reverse('api:post_detail', args=[post.pk]),
+            reverse('api:comments', args=[post.pk]),
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'api_renamed'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, 200)
+                etags[url] = response['ETag']
+
+        admin = User.objects.create_superuser('admin', 'a@example.com', 'pw')
+        self.client.force_login(admin)
+        self.client.post(
+            reverse('admin:posts_group_change', args=[self.group.pk]),
+            {'title': 'Группа', 'slug': 'api_renamed', 'description': 'О'},
+        )
+        for url in (urls[0], urls[2]):
+            with self.subTest(url=url, renamed='group'):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_and_missing(self):
+        post = self.posts[0]
+        data = self.client.get(
+            reverse('api:post_detail', args=[post.pk])
+        ).json()
+        self.assertEqual(data['text'], post.text)
+        self.assertEqual(data['group'], self.group.slug)
+        response = self.client.get(reverse('api:post_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
+
+
+class ApiWriteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='api_user')
+        cls.author = User.objects.create_user(username='api_writer')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_cannot_write(self):
+        response = self.client.post(
+            reverse('api:comments', args=[self.post.pk]), {'text': 'Привет'}
+        )
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post(
+            reverse('api:follow', args=[self.author.username])
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_add_comment_changes_etag(self):
+        url = reverse('api:comments', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.user)
+        response = self.client.post(url, {'text': 'Привет'})
+        self.assertEqual(response.status_code, 201)
+        root = Comment.objects.get()
+        response = self.client.post(
+            url, {'text': 'Ответ', 'parent': root.pk}
+        )
+        self.assertEqual(response.json()['parent'], root.pk)
+        self.assertEqual(self.client.post(url, {}).status_code, 400)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        thread = response.json()['results'][0]
+        self.assertEqual(thread['text'], 'Привет')
+        self.assertEqual(
+            [reply['text'] for reply in thread['replies']], ['Ответ']
+        )
+
+    def test_comment_keeps_post_etag(self):
+        """Комментарий меняет ETag комментариев, но не поста."""
+        post_url = reverse('api:post_detail', args=[self.post.pk])
+        comments_url = reverse('api:comments', args=[self.post.pk])
+        post_etag = self.client.get(post_url)['ETag']
+        comments_etag = self.client.get(comments_url)['ETag']
+        comment = Comment.objects.create(post=self.post, author=self.user,
+                                         text='Привет')
+        self.assertEqual(self.client.get(post_url)['ETag'], post_etag)
+        etag = self.client.get(comments_url)['ETag']
+        self.assertNotEqual(etag, comments_etag)
+        comment.delete()
+        self.assertNotEqual(self.client.get(comments_url)['ETag'], etag)
+
+    def test_follow_and_unfollow(self):
+        self.client.force_login(self.user)
+        url = reverse('api:follow', args=[self.author.username])
+        self.assertEqual(self.client.post(url).json(), {'following': True})
+        self.assertTrue(
+            Follow.objects.filter(user=self.user, author=self.author).exists()
+        )
+        self.assertEqual(self.client.delete(url).json(), {'following': False})
+        self.assertFalse(Follow.objects.exists())
+        self_url = reverse('api:follow', args=[self.user.username])
+        self.assertEqual(self.client.post(self_url).status_code, 400)
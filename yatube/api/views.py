@@ -0,0 +1,216 @@
+"""JSON API для мобильных клиентов.
+
+Ленты отдаются курсорными страницами (?cursor=) с выбором полей
+(?fields=). ETag строится из версий лент (posts.caching) и строки
+запроса, поэтому на If-None-Match с неизменившейся лентой отвечаем 304,
+не читая посты из базы.
+"""
+import hashlib
+from functools import wraps
+
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_http_methods
+
+from posts.caching import feed_version
+from posts.comments import comment_threads
+from posts.forms import CommentForm
+from posts.models import Follow, Group, Post, User
+from posts.paginators import CursorPaginator
+from posts.views import COMMENTS_IN_PAGE, POSTS_IN_PAGE
+
+from .serializers import (COMMENT_FIELDS, POST_FIELDS, FieldsError,
+                          parse_fields, serialize)
+
+
+def error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error('Требуется авторизация', 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def with_fields(available):
+    """Передаёт во view список полей из ?fields= или отвечает 400."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                fields = parse_fields(request.GET.get('fields'), available)
+            except FieldsError as exc:
+                return error(str(exc), 400)
+            return view(request, *args, fields=fields, **kwargs)
+        return wrapper
+    return decorator
+
+
+def make_etag(request, versions):
+    raw = f'{versions}|{request.get_full_path()}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def index_etag(request):
+    return make_etag(request, feed_version(('index',)))
+
+
+def group_etag(request, slug):
+    pk = Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    return make_etag(request, feed_version(('group', pk)))
+
+
+def author_etag(request, username):
+    pk = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    return make_etag(
+        request, feed_version(('author', pk), ('user_name', pk))
+    )
+
+
+def post_etag(request, post_id):
+    """Версия поста, имени его автора и названия группы.
+
+    Переименование любого пользователя или группы увеличивает ещё и
+    SITE_FEED, который feed_version добавляет к каждой ленте: так ETag
+    меняется и у лент, и у комментариев других авторов (comments_etag).
+    """
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if row is None:
+        return None
+    author_id, group_id = row
+    feeds = [('post', post_id), ('user_name', author_id)]
+    if group_id is not None:
+        feeds.append(('group_name', group_id))
+    return make_etag(request, feed_version(*feeds))
+
+
+def comments_etag(request, post_id):
+    """Версия комментариев поста: меняется с каждым комментарием."""
+    if not Post.objects.filter(pk=post_id).exists():
+        return None
+    return make_etag(request, feed_version(('post_comments', post_id)))
+
+
+def feed_response(request, queryset, fields):
+    page = CursorPaginator(
+        queryset.select_related('author', 'group'), POSTS_IN_PAGE
+    ).get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [serialize(post, fields, POST_FIELDS) for post in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+@require_http_methods(['GET', 'HEAD'])
+@condition(etag_func=index_etag)
+@with_fields(POST_FIELDS)
+def index(request, fields):
+    return feed_response(request, Post.objects.all(), fields)
+
+
+@require_http_methods(['GET', 'HEAD'])
+@condition(etag_func=group_etag)
+@with_fields(POST_FIELDS)
+def group_posts(request, slug, fields):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return error('Группа не найдена', 404)
+    return feed_response(request, group.posts.all(), fields)
+
+
+@require_http_methods(['GET', 'HEAD'])
+@condition(etag_func=author_etag)
+@with_fields(POST_FIELDS)
+def profile(request, username, fields):
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return error('Пользователь не найден', 404)
+    return feed_response(request, author.posts.all(), fields)
+
+
+@require_http_methods(['GET', 'HEAD'])
+@condition(etag_func=post_etag)
+@with_fields(POST_FIELDS)
+def post_detail(request, post_id, fields):
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    if post is None:
+        return error('Пост не найден', 404)
+    return JsonResponse(serialize(post, fields, POST_FIELDS))
+
+
+@condition(etag_func=comments_etag)
+@with_fields(COMMENT_FIELDS)
+def comment_list(request, post_id, fields):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return error('Пост не найден', 404)
+    page = comment_threads(post, request.GET.get('cursor'), COMMENTS_IN_PAGE)
+    return JsonResponse({
+        'results': [
+            {
+                **serialize(comment, fields, COMMENT_FIELDS),
+                'replies': [
+                    serialize(reply, fields, COMMENT_FIELDS)
+                    for reply in comment.shown_replies
+                ],
+                'more_replies': comment.more_replies,
+            }
+            for comment in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
+
+@api_login_required
+def add_comment(request, post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return error('Пост не найден', 404)
+    form = CommentForm(request.POST, post=post)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    comment.save()
+    return JsonResponse(
+        serialize(comment, list(COMMENT_FIELDS), COMMENT_FIELDS), status=201
+    )
+
+
+@require_http_methods(['GET', 'HEAD', 'POST'])
+def comments(request, post_id):
+    """GET — страница веток комментариев, POST — новый комментарий."""
+    if request.method == 'POST':
+        return add_comment(request, post_id)
+    return comment_list(request, post_id)
+
+
+@require_http_methods(['POST', 'DELETE'])
+@api_login_required
+def follow(request, username):
+    """POST — подписаться на автора, DELETE — отписаться."""
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return error('Пользователь не найден', 404)
+    if request.method == 'DELETE':
+        Follow.objects.filter(user=request.user, author=author).delete()
+        return JsonResponse({'following': False})
+    if author == request.user:
+        return error('Нельзя подписаться на себя', 400)
+    Follow.objects.get_or_create(user=request.user, author=author)
+    return JsonResponse({'following': True})
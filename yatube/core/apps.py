@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import db, metrics, profiling
+        db.install()
+        metrics.install()
+        profiling.install()
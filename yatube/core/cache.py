@@ -0,0 +1,182 @@
+"""Двухуровневый кэш: L1 в памяти процесса поверх общего L2.
+
+L2 — общий для всех воркеров бэкенд (файлы, таблица БД, Redis), L1 —
+LocMemCache с коротким сроком жизни. Каждое удаление, incr/decr и clear
+получает в L2 номер и запись журнала со списком изменённых ключей.
+Процесс сверяет номер не чаще раза в SYNC_INTERVAL секунд и удаляет из
+своего L1 только ключи из новых записей журнала, поэтому запись одного
+счётчика версии не сбрасывает остальной L1. Если процесс отстал больше
+чем на LOG_SIZE записей или запись уже вытеснена из L2, он очищает L1
+целиком.
+"""
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .metrics import cache_requests
+
+SEQUENCE_KEY: str = 'tiered_cache_sequence'
+LOG_KEY: str = 'tiered_cache_log:{}'
+LOG_TIMEOUT: int = 60 * 5
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._sync_interval = options.get('SYNC_INTERVAL', 1)
+        self._log_size = options.get('LOG_SIZE', 1000)
+        l1_name = options.get('L1_NAME', f'tiered-l1-{location}')
+        self._l1 = LocMemCache(l1_name, {
+            'TIMEOUT': self._l1_timeout,
+            'OPTIONS': {'MAX_ENTRIES': options.get('L1_MAX_ENTRIES', 1000)},
+        })
+        self._sequence = None
+        self._synced = 0
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _l1_timeout_for(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self._l1_timeout
+        return min(timeout, self._l1_timeout)
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced < self._sync_interval:
+            return
+        self._synced = now
+        sequence = self.l2.get(SEQUENCE_KEY)
+        if sequence == self._sequence:
+            return
+        if (self._sequence is None or sequence is None
+                or not 0 < sequence - self._sequence <= self._log_size):
+            self._l1.clear()
+        else:
+            names = [
+                LOG_KEY.format(number)
+                for number in range(self._sequence + 1, sequence + 1)
+            ]
+            entries = self.l2.get_many(names)
+            if len(entries) < len(names):
+                # Запись вытеснена: изменённые ключи неизвестны.
+                self._l1.clear()
+            else:
+                for entry in entries.values():
+                    for key, version in entry:
+                        self._l1.delete(key, version=version)
+        self._sequence = sequence
+
+    def _publish(self, keys, version=None):
+        """Записывает в журнал изменённые ключи."""
+        entry = [(key, version) for key in keys]
+        try:
+            sequence = self.l2.incr(SEQUENCE_KEY)
+        except ValueError:
+            # Номер вытеснен из L2: начинаем с времени, чтобы остальные
+            # процессы увидели разрыв и очистили свой L1.
+            sequence = int(time.time() * 1000)
+            self.l2.set(SEQUENCE_KEY, sequence, None)
+        self.l2.set(LOG_KEY.format(sequence), entry, LOG_TIMEOUT)
+        if self._sequence == sequence - 1:
+            # Других изменений между нашими не было: L1 уже актуален.
+            self._sequence = sequence
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        sentinel = object()
+        value = self._l1.get(key, sentinel, version=version)
+        if value is not sentinel:
+            cache_requests.inc(cache='l1', result='hit')
+            return value
+        cache_requests.inc(cache='l1', result='miss')
+        value = self.l2.get(key, sentinel, version=version)
+        if value is sentinel:
+            cache_requests.inc(cache='l2', result='miss')
+            return default
+        cache_requests.inc(cache='l2', result='hit')
+        self._l1.set(key, value, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = self._l1.get_many(keys, version=version)
+        missing = [key for key in keys if key not in found]
+        cache_requests.inc(len(found), cache='l1', result='hit')
+        if missing:
+            cache_requests.inc(len(missing), cache='l1', result='miss')
+            fetched = self.l2.get_many(missing, version=version)
+            cache_requests.inc(len(fetched), cache='l2', result='hit')
+            cache_requests.inc(len(missing) - len(fetched), cache='l2',
+                               result='miss')
+            self._l1.set_many(fetched, version=version)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        self._sync()
+        return (self._l1.has_key(key, version=version)
+                or self.l2.has_key(key, version=version))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._sync()
+        self.l2.set(key, value, timeout, version=version)
+        self._l1.set(key, value, self._l1_timeout_for(timeout),
+                     version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._sync()
+        failed = self.l2.set_many(data, timeout, version=version)
+        self._l1.set_many(
+            {key: value for key, value in data.items() if key not in failed},
+            self._l1_timeout_for(timeout), version=version,
+        )
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._sync()
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._l1.set(key, value, self._l1_timeout_for(timeout),
+                         version=version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._sync()
+        value = self.l2.incr(key, delta, version=version)
+        self._l1.delete(key, version=version)
+        self._publish([key], version)
+        return value
+
+    def delete(self, key, version=None):
+        self._sync()
+        self.l2.delete(key, version=version)
+        self._l1.delete(key, version=version)
+        self._publish([key], version)
+
+    def delete_many(self, keys, version=None):
+        self._sync()
+        keys = list(keys)
+        self.l2.delete_many(keys, version=version)
+        self._l1.delete_many(keys, version=version)
+        self._publish(keys, version)
+
+    def clear(self):
+        sequence = self.l2.get(SEQUENCE_KEY) or 0
+        self.l2.clear()
+        self._l1.clear()
+        # Разрыв больше журнала заставит все процессы очистить L1.
+        self._sequence = sequence + self._log_size + 1
+        self.l2.set(SEQUENCE_KEY, self._sequence, None)
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
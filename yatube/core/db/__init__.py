@@ -0,0 +1,40 @@
+"""Настройка соединений с БД.
+
+На SQLite при каждом новом соединении выполняются PRAGMA из ключа
+PRAGMAS настроек базы: журнал WAL (читатели не ждут писателя),
+synchronous=NORMAL (в режиме WAL безопасно для целостности), mmap_size
+и busy_timeout, чтобы конкурирующая запись ждала, а не падала с
+«database is locked».
+
+Django 2.2 не умеет CONN_HEALTH_CHECKS, поэтому ключ поддержан здесь:
+в начале запроса постоянные соединения таких баз проверяются, и
+неработающее закрывается — следующий запрос к БД откроет новое, а не
+получит ошибку на соединении, которое оборвал сервер или прокси.
+"""
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def check_connections(**kwargs):
+    for connection in connections.all():
+        if (connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
+
+
+def install():
+    """Подключает обработчики; вызывается из CoreConfig.ready()."""
+    connection_created.connect(apply_pragmas, dispatch_uid='core.db')
+    request_started.connect(check_connections, dispatch_uid='core.db')
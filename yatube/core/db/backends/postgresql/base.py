@@ -0,0 +1,8 @@
+"""PostgreSQL с пулом соединений core.db.pool."""
+from django.db.backends.postgresql import base
+
+from core.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,12 @@
+"""SQLite с тем же пулом, что и у PostgreSQL.
+
+Нужен, чтобы проверять пул локально и в тестах без сервера PostgreSQL;
+в рабочей конфигурации SQLite обходится постоянными соединениями.
+"""
+from django.db.backends.sqlite3 import base
+
+from core.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,123 @@
+"""Пул соединений процесса для бэкендов core.db.backends.
+
+Соединение, которое Django закрывает (в конце запроса при
+CONN_MAX_AGE = 0 или по истечении срока), не рвётся, а после отката
+возвращается в пул, и следующий connect() в любом потоке берёт его
+оттуда вместо нового подключения к серверу. Простаивающих соединений
+хранится не больше POOL_SIZE, лишние закрываются; при исчерпании пула
+открывается новое, так что запросы никогда не ждут друг друга.
+Перед выдачей соединение проверяется запросом SELECT 1, если у базы
+включён CONN_HEALTH_CHECKS. После fork (gunicorn --preload) пул
+процесса-родителя забывается без закрытия: сокеты общие с родителем.
+"""
+import os
+import threading
+from collections import deque
+
+DEFAULT_POOL_SIZE: int = 10
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    def __init__(self, size=DEFAULT_POOL_SIZE):
+        self.size = size
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._idle.clear()
+            self._pid = os.getpid()
+
+    def acquire(self, check=None):
+        """Простаивающее соединение, прошедшее check, или None."""
+        while True:
+            with self._lock:
+                self._check_fork()
+                if not self._idle:
+                    return None
+                # Последнее возвращённое: его кэши на сервере ещё тёплые.
+                connection = self._idle.pop()
+            if check is None or check(connection):
+                return connection
+            close_quietly(connection)
+
+    def release(self, connection):
+        with self._lock:
+            self._check_fork()
+            if len(self._idle) < self.size:
+                self._idle.append(connection)
+                return
+        close_quietly(connection)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for connection in idle:
+            close_quietly(connection)
+
+    def __len__(self):
+        return len(self._idle)
+
+
+def get_pool(settings_dict):
+    key = tuple(str(settings_dict.get(name)) for name in (
+        'ENGINE', 'NAME', 'USER', 'HOST', 'PORT',
+    ))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                settings_dict.get('POOL_SIZE', DEFAULT_POOL_SIZE)
+            )
+    return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """Берёт соединения из пула и возвращает их туда вместо закрытия."""
+
+    @property
+    def pool(self):
+        return get_pool(self.settings_dict)
+
+    def ping(self, connection):
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        check = self.ping if self.settings_dict.get(
+            'CONN_HEALTH_CHECKS'
+        ) else None
+        connection = self.pool.acquire(check)
+        if connection is None:
+            connection = super().get_new_connection(conn_params)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block:
+            # Транзакция прервана посередине — такое соединение не отдаём.
+            return super()._close()
+        try:
+            self.connection.rollback()
+        except self.Database.Error:
+            return close_quietly(self.connection)
+        self.pool.release(self.connection)
@@ -0,0 +1,296 @@
+"""Метрики в текстовом формате Prometheus.
+
+Значения копятся в памяти процесса без блокировок: у каждого потока
+свой словарь, на экспорт они складываются (блокировка берётся только
+при появлении нового потока и при сборе). Если задан METRICS_DIR,
+фоновый поток процесса раз в FLUSH_INTERVAL секунд сбрасывает его
+снимок в файл <pid>-<время старта>.json этого каталога (запись во
+временный файл и os.replace), а /metrics складывает файлы всех
+воркеров gunicorn. Запросы на запись файла не тратят времени.
+Файлы завершившихся воркеров остаются, поэтому счётчики не убывают;
+при перезапуске сервиса каталог нужно очистить.
+"""
+import abc
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+FLUSH_INTERVAL: float = 1.0
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = tuple(2 ** power * 1024 for power in range(4, 15, 2))
+VIEW_NAMESPACES = ('posts', 'users')
+
+_shards = []
+_shards_lock = threading.Lock()
+# Значения завершившихся потоков, чтобы список _shards не рос.
+_retired = {}
+_local = threading.local()
+_registry = {}
+_started = time.time()
+# pid процесса, в котором запущен поток сброса: после fork его нет.
+_flusher_pid = None
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _shards_lock:
+            _shards.append((threading.current_thread(), shard))
+            start_flusher()
+    return shard
+
+
+class Metric(abc.ABC):
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry[name] = self
+
+    def key(self, labels):
+        return self.name, tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def merge(self, current, value):
+        """Сумма двух значений метрики; current может быть None."""
+
+    @abc.abstractmethod
+    def samples(self, labels, value):
+        """Строки экспорта: (имя, метки, значение)."""
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = _shard()
+        key = self.key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def merge(self, current, value):
+        return (current or 0) + value
+
+    def samples(self, labels, value):
+        yield self.name + '_total', labels, value
+
+
+class Histogram(Metric):
+    """Значение — счётчики по корзинам, затем сумма и число наблюдений."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard = _shard()
+        key = self.key(labels)
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def merge(self, current, value):
+        if current is None:
+            return list(value)
+        return [a + b for a, b in zip(current, value)]
+
+    def samples(self, labels, value):
+        cumulative = 0
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        for bound, count in zip(bounds, value):
+            cumulative += count
+            yield self.name + '_bucket', labels + (('le', bound),), cumulative
+        yield self.name + '_sum', labels, value[-2]
+        yield self.name + '_count', labels, value[-1]
+
+
+view_latency = Histogram(
+    'yatube_view_latency_seconds', 'Время ответа view.', ['view'],
+)
+cache_requests = Counter(
+    'yatube_cache_requests', 'Чтения кэша: попадания и промахи.',
+    ['cache', 'result'],
+)
+db_queries = Counter(
+    'yatube_db_queries', 'SQL-запросы.', ['database'],
+)
+db_query_seconds = Counter(
+    'yatube_db_query_seconds', 'Суммарное время SQL-запросов.', ['database'],
+)
+upload_bytes = Histogram(
+    'yatube_upload_bytes', 'Размеры загруженных картинок.', ['result'],
+    buckets=SIZE_BUCKETS,
+)
+thumbnail_seconds = Histogram(
+    'yatube_thumbnail_seconds', 'Время построения миниатюры и вариантов.',
+)
+
+
+def merge_into(merged, values):
+    # list() копирует словарь целиком под GIL, даже если поток
+    # владельца в это время его меняет.
+    for key, value in list(values.items()):
+        metric = _registry[key[0]]
+        merged[key] = metric.merge(merged.get(key), value)
+
+
+def snapshot():
+    """Значения этого процесса: {(метрика, значения меток): значение}."""
+    with _shards_lock:
+        for thread, shard in _shards:
+            if not thread.is_alive():
+                merge_into(_retired, shard)
+        _shards[:] = [item for item in _shards if item[0].is_alive()]
+        merged = {}
+        merge_into(merged, _retired)
+        for thread, shard in _shards:
+            merge_into(merged, shard)
+    return merged
+
+
+def process_file():
+    return os.path.join(
+        settings.METRICS_DIR, f'{os.getpid()}-{int(_started * 1000)}.json'
+    )
+
+
+def flush():
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = process_file()
+    temp_path = f'{path}.{threading.get_ident()}.part'
+    with open(temp_path, 'w') as temp:
+        json.dump([
+            [name, list(labels), value]
+            for (name, labels), value in snapshot().items()
+        ], temp)
+    os.replace(temp_path, path)
+
+
+def flush_forever():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            # Каталог мог временно пропасть: попробуем в следующий раз.
+            pass
+
+
+def start_flusher():
+    """Запускает поток сброса в этом процессе; вызывать под _shards_lock."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid() or not settings.METRICS_DIR:
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(
+        target=flush_forever, name='metrics-flush', daemon=True
+    ).start()
+    atexit.register(flush)
+
+
+def collect():
+    """Значения всех процессов; свой процесс берётся из памяти."""
+    merged = snapshot()
+    directory = settings.METRICS_DIR
+    if directory and os.path.isdir(directory):
+        own = os.path.basename(process_file())
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json') or filename == own:
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as source:
+                    rows = json.load(source)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in rows:
+                metric = _registry.get(name)
+                if metric is None:
+                    continue
+                key = (name, tuple(labels))
+                merged[key] = metric.merge(merged.get(key), value)
+    return merged
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, value.replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+def exposition():
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    values = collect()
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for key in sorted(key for key in values if key[0] == name):
+            labels = tuple(zip(metric.labelnames, key[1]))
+            for sample, sample_labels, value in metric.samples(
+                labels, values[key]
+            ):
+                lines.append(f'{sample}{format_labels(sample_labels)} '
+                             f'{value}')
+    return '\n'.join(lines) + '\n'
+
+
+def record_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        alias = context['connection'].alias
+        db_queries.inc(database=alias)
+        db_query_seconds.inc(time.perf_counter() - start, database=alias)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    # Сигнал приходит на каждое переподключение той же обёртки
+    # DatabaseWrapper (CONN_MAX_AGE = 0, пул), а не только на первое.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install():
+    """Подключает учёт SQL-запросов; вызывается из CoreConfig.ready()."""
+    connection_created.connect(
+        instrument_connection, dispatch_uid='core.metrics'
+    )
+
+
+class MetricsMiddleware:
+    """Гистограмма времени ответа по имени URL из VIEW_NAMESPACES."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        if match is not None and match.namespace in VIEW_NAMESPACES:
+            view_latency.observe(time.perf_counter() - start,
+                                 view=match.view_name)
+        return response
@@ -0,0 +1,197 @@
+"""Выборочное профилирование запросов.
+
+ProfilingMiddleware замеряет долю запросов (PROFILING_SAMPLE_RATE):
+число и суммарное время SQL-запросов, повторы одинаковых запросов,
+время рендера каждого шаблона и участков, размеченных span(), например
+построения миниатюр. Итог уходит в заголовок Server-Timing и в журнал
+core.profiling одной JSON-строкой. Имена шаблонов и число запросов
+в Server-Timing видят только сотрудники (или все при DEBUG), остальным
+уходят одни длительности. Запрос сотрудника (или любой при
+DEBUG) с параметром ?profile профилируется всегда, и к странице
+добавляется панель с результатами. Middleware стоит после
+AuthenticationMiddleware, чтобы знать пользователя.
+
+Незамеренный запрос стоит одного вызова random(); обёртка рендера
+шаблонов в этом случае только читает пустую ContextVar.
+"""
+import json
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+from django.template.loader import render_to_string
+
+PROFILE_PARAM: str = 'profile'
+OVERLAY_TEMPLATE: str = 'core/profile_overlay.html'
+DUPLICATES_IN_LOG: int = 5
+
+logger = logging.getLogger(__name__)
+_current = ContextVar('profile', default=None)
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.templates = defaultdict(float)
+        self.spans = defaultdict(float)
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[(sql, repr(params))] += 1
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values())
+
+    def timings(self):
+        """Тройки (метрика, описание, миллисекунды) для Server-Timing."""
+        yield 'total', '', self.total * 1000
+        yield 'db', f'{self.queries} queries', self.sql_time * 1000
+        for name, seconds in self.spans.items():
+            yield name, '', seconds * 1000
+        for name, seconds in self.templates.items():
+            yield 'tpl', name, seconds * 1000
+
+    def server_timing(self, detailed=False):
+        """Значение Server-Timing; без detailed — только длительности."""
+        entries = []
+        for metric, description, ms in self.timings():
+            if not detailed:
+                if metric == 'tpl':
+                    # Шаблоны различаются только описанием.
+                    continue
+                description = ''
+            entry = metric
+            if description:
+                entry += ';desc="{}"'.format(description.replace('"', "'"))
+            entries.append(f'{entry};dur={ms:.1f}')
+        return ', '.join(entries)
+
+    def as_dict(self, request, response):
+        return {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(self.total * 1000, 1),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'duplicate_queries': self.duplicates,
+            'top_duplicates': [
+                {'sql': sql, 'count': count}
+                for (sql, params), count
+                in self.statements.most_common(DUPLICATES_IN_LOG)
+                if count > 1
+            ],
+            'templates_ms': {
+                name: round(seconds * 1000, 1)
+                for name, seconds in self.templates.items()
+            },
+            'spans_ms': {
+                name: round(seconds * 1000, 1)
+                for name, seconds in self.spans.items()
+            },
+        }
+
+
+@contextmanager
+def span(name):
+    """Добавляет время блока к метрике name текущего профиля."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.spans[name] += time.perf_counter() - start
+
+
+_template_render = Template.render
+
+
+def profiled_render(self, context):
+    profile = _current.get()
+    if profile is None:
+        return _template_render(self, context)
+    start = time.perf_counter()
+    try:
+        return _template_render(self, context)
+    finally:
+        # Время включающее: у base.html в него входят и все include.
+        name = self.origin.template_name or '<string>'
+        profile.templates[name] += time.perf_counter() - start
+
+
+def install():
+    """Подменяет Template.render; вызывается из CoreConfig.ready()."""
+    Template.render = profiled_render
+
+
+def can_see_overlay(request):
+    user = getattr(request, 'user', None)
+    return settings.DEBUG or (user is not None and user.is_staff)
+
+
+def add_overlay(request, response, profile):
+    content_type = response.get('Content-Type', '')
+    if response.streaming or not content_type.startswith('text/html'):
+        return
+    content = response.content.decode(response.charset)
+    position = content.rfind('</body>')
+    if position == -1:
+        return
+    overlay = render_to_string(OVERLAY_TEMPLATE, {
+        'profile': profile,
+        'timings': list(profile.timings()),
+    })
+    response.content = content[:position] + overlay + content[position:]
+    if response.has_header('Content-Length'):
+        response['Content-Length'] = len(response.content)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        forced = PROFILE_PARAM in request.GET and can_see_overlay(request)
+        if not forced and random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        profile.finish()
+        logger.info(json.dumps(profile.as_dict(request, response)))
+        response['Server-Timing'] = profile.server_timing(
+            detailed=can_see_overlay(request)
+        )
+        if forced:
+            add_overlay(request, response, profile)
+        return response
@@ -0,0 +1,80 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import TieredCache
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-test-shared',
+    },
+}
+
+
+def make_worker(name):
+    """Кэш отдельного воркера: свой L1, общий L2."""
+    return TieredCache('shared', {
+        'OPTIONS': {'L1_NAME': name, 'SYNC_INTERVAL': 0},
+    })
+
+
+@override_settings(CACHES=CACHES)
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.first = make_worker('tiered-test-first')
+        self.second = make_worker('tiered-test-second')
+        self.first.clear()
+
+    def test_values_are_shared_between_workers(self):
+        """Запись одного воркера видна другому через L2."""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get_many(['key', 'missing']),
+                         {'key': 'value'})
+
+    def test_reads_are_served_from_l1(self):
+        """Повторное чтение не обращается к L2."""
+        self.first.set('key', 'value')
+        caches['shared'].set('key', 'changed behind L1')
+        self.assertEqual(self.first.get('key'), 'value')
+
+    def test_invalidation_reaches_other_workers(self):
+        """Удаление и incr в одном воркере сбрасывают L1 другого."""
+        self.first.set('key', 'value')
+        self.first.set('counter', 1)
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get('counter'), 1)
+        self.first.delete('key')
+        self.first.incr('counter')
+        self.assertIsNone(self.second.get('key'))
+        self.assertEqual(self.second.get('counter'), 2)
+
+    def test_writes_keep_unrelated_l1_entries(self):
+        """incr одного ключа не сбрасывает остальной L1 других воркеров."""
+        self.first.set('key', 'value')
+        self.first.set('counter', 1)
+        self.second.get('key')
+        caches['shared'].set('key', 'changed behind L1')
+        self.first.incr('counter')
+        self.first.delete_many(['other'])
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get('counter'), 2)
+
+    def test_lagging_worker_clears_l1(self):
+        """Отставший от журнала воркер очищает L1 целиком."""
+        self.first.set('key', 'value')
+        self.second.get('key')
+        caches['shared'].set('key', 'changed behind L1')
+        self.second._log_size = 1
+        self.first.delete('a')
+        self.first.delete('b')
+        self.assertEqual(self.second.get('key'), 'changed behind L1')
+
+    def test_clear_reaches_other_workers(self):
+        self.first.set('key', 'value')
+        self.second.get('key')
+        self.first.clear()
+        self.assertIsNone(self.second.get('key'))
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.db import connection
+from django.db.backends.sqlite3 import base
+from django.test import SimpleTestCase, TestCase
+
+from core.db import check_connections
+from core.db.backends.sqlite3.base import DatabaseWrapper
+from core.db.pool import ConnectionPool, get_pool
+
+
+class FakeConnection:
+    def __init__(self, usable=True):
+        self.usable = usable
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def test_acquire_returns_released_connection(self):
+        pool = ConnectionPool(size=2)
+        self.assertIsNone(pool.acquire())
+        first = FakeConnection()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(len(pool), 0)
+
+    def test_idle_connections_are_capped(self):
+        pool = ConnectionPool(size=1)
+        kept, extra = FakeConnection(), FakeConnection()
+        pool.release(kept)
+        pool.release(extra)
+        self.assertEqual(len(pool), 1)
+        self.assertTrue(extra.closed)
+        self.assertFalse(kept.closed)
+
+    def test_failed_check_discards_connection(self):
+        pool = ConnectionPool()
+        good, broken = FakeConnection(), FakeConnection(usable=False)
+        pool.release(good)
+        pool.release(broken)
+        self.assertIs(pool.acquire(lambda conn: conn.usable), good)
+        self.assertTrue(broken.closed)
+
+    def test_forked_process_forgets_parent_connections(self):
+        pool = ConnectionPool()
+        inherited = FakeConnection()
+        pool.release(inherited)
+        pool._pid = -1
+        self.assertIsNone(pool.acquire())
+        self.assertFalse(inherited.closed)
+
+
+class PooledBackendTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        name = os.path.join(directory, 'pool.sqlite3')
+        self.addCleanup(lambda: os.path.exists(name) and os.remove(name))
+        self.settings_dict = {
+            'ENGINE': 'core.db.backends.sqlite3',
+            'NAME': name,
+            'CONN_HEALTH_CHECKS': True,
+            'POOL_SIZE': 1,
+        }
+        self.addCleanup(lambda: get_pool(self.settings_dict).clear())
+
+    def make_wrapper(self):
+        settings_dict = dict(
+            self.settings_dict, ATOMIC_REQUESTS=False, AUTOCOMMIT=True,
+            CONN_MAX_AGE=0, OPTIONS={}, TIME_ZONE=None,
+        )
+        return DatabaseWrapper(settings_dict, alias='pooled')
+
+    def test_closed_connection_is_reused(self):
+        first = self.make_wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        self.assertEqual(len(get_pool(self.settings_dict)), 1)
+        second = self.make_wrapper()
+        second.ensure_connection()
+        self.assertIs(second.connection, raw)
+        second.close()
+
+    def test_broken_connection_is_replaced(self):
+        first = self.make_wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        raw.close()
+        second = self.make_wrapper()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIsNot(second.connection, raw)
+        second.close()
+
+    def test_uncommitted_work_is_rolled_back(self):
+        wrapper = self.make_wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id integer)')
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO item VALUES (1)')
+        wrapper.close()
+        wrapper = self.make_wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM item')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        wrapper.close()
+
+
+class ConnectionSettingsTest(TestCase):
+    def test_sqlite_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            # 1 — NORMAL.
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_unusable_connection_is_closed_on_request(self):
+        wrapper = base.DatabaseWrapper({
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'checked.db',
+            'CONN_HEALTH_CHECKS': True,
+        }, alias='checked')
+        wrapper.connection = sqlite3.connect(':memory:')
+        wrapper.is_usable = lambda: False
+        with mock.patch('core.db.connections') as connections:
+            connections.all.return_value = [wrapper]
+            check_connections()
+        self.assertIsNone(wrapper.connection)
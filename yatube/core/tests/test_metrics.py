@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+
+def sample(text, line_start):
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_metrics(self, token='secret', **extra):
+        return self.client.get(
+            '/metrics', HTTP_AUTHORIZATION=f'Bearer {token}', **extra
+        )
+
+    def test_views_and_queries_are_exported(self):
+        self.client.get(reverse('posts:index'))
+        text = self.get_metrics().content.decode()
+        self.assertIn('# TYPE yatube_view_latency_seconds histogram', text)
+        self.assertGreaterEqual(sample(
+            text, 'yatube_view_latency_seconds_count{view="posts:index"}'
+        ), 1)
+        self.assertGreater(
+            sample(text, 'yatube_db_queries_total{database="default"}'), 0
+        )
+        self.assertGreater(sample(
+            text, 'yatube_cache_requests_total{cache="article",result='
+        ) + sample(text, 'yatube_view_latency_seconds_bucket{'
+                         'view="posts:index",le="+Inf"}'), 0)
+
+    def test_token_is_required(self):
+        self.assertEqual(self.get_metrics().status_code, 200)
+        self.assertEqual(self.get_metrics('wrong').status_code, 404)
+        # Локальный адрес без токена не помогает: так выглядит прокси.
+        response = self.client.get('/metrics', REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 404)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.get_metrics('None').status_code, 404)
+            self.assertEqual(self.get_metrics('').status_code, 404)
+
+    def test_flush_runs_off_request_path(self):
+        flushed_by = []
+        real_flush = metrics.flush
+
+        def flush():
+            flushed_by.append(threading.current_thread().name)
+            real_flush()
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory), \
+                mock.patch.object(metrics, 'FLUSH_INTERVAL', 0.01), \
+                mock.patch.object(metrics, '_flusher_pid', None), \
+                mock.patch.object(metrics, 'flush', flush):
+            thread = threading.Thread(target=metrics.db_queries.inc,
+                                      kwargs={'database': 'thread'})
+            thread.start()
+            thread.join()
+            for _ in range(100):
+                if os.path.exists(metrics.process_file()):
+                    break
+                time.sleep(0.01)
+            with open(metrics.process_file()) as file:
+                rows = json.load(file)
+        self.assertIn([metrics.db_queries.name, ['thread'], 1], rows)
+        self.assertEqual(set(flushed_by), {'metrics-flush'})
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.thumbnail_seconds
+        before = metrics.snapshot().get(
+            (histogram.name, ()), [0] * (len(histogram.buckets) + 3)
+        )
+        thread = threading.Thread(target=histogram.observe, args=(0.3,))
+        thread.start()
+        thread.join()
+        histogram.observe(20)
+        text = metrics.exposition()
+        self.assertEqual(
+            sample(text, 'yatube_thumbnail_seconds_bucket{le="0.5"}'),
+            sum(before[:6]) + 1,
+        )
+        self.assertEqual(
+            sample(text, 'yatube_thumbnail_seconds_bucket{le="+Inf"}'),
+            before[-1] + 2,
+        )
+
+    def test_workers_are_merged_through_directory(self):
+        counter = metrics.db_queries
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(METRICS_DIR=directory):
+                metrics.flush()
+                self.assertTrue(os.path.exists(metrics.process_file()))
+                with open(os.path.join(directory, '1-1.json'), 'w') as file:
+                    json.dump([[counter.name, ['other'], 7]], file)
+                own = metrics.snapshot()[(counter.name, ('default',))]
+                values = metrics.collect()
+        self.assertEqual(values[(counter.name, ('other',))], 7)
+        self.assertGreaterEqual(values[(counter.name, ('default',))], own)
@@ -0,0 +1,65 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(DEBUG=False)
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='profiled')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_request_is_untouched(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        response = self.client.get(reverse('posts:index'), {'profile': ''})
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request_is_timed_and_logged(self):
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertNotIn('desc=', timing)
+        self.assertNotIn('tpl', timing)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], reverse('posts:index'))
+        self.assertGreater(record['queries'], 0)
+        self.assertIn('posts/index.html', record['templates_ms'])
+        self.assertNotIn('profile-overlay', response.content.decode())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_staff_get_detailed_timing(self):
+        """Шаблоны и число запросов в Server-Timing видят сотрудники."""
+        self.client.force_login(self.staff)
+        with self.assertLogs('core.profiling', 'INFO'):
+            response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertIn('db;desc="', timing)
+        self.assertIn('tpl;desc="posts/includes/article.html"', timing)
+        self.assertIn('tpl;desc="posts/includes/paginator.html"', timing)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_staff_can_force_overlay(self):
+        self.client.force_login(self.staff)
+        with self.assertLogs('core.profiling', 'INFO'):
+            response = self.client.get(
+                reverse('posts:index'), {'profile': ''}
+            )
+        self.assertTrue(response.has_header('Server-Timing'))
+        self.assertContains(response, 'id="profile-overlay"')
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+
+from django.test import RequestFactory, SimpleTestCase
+
+from core.views import IMMUTABLE_CACHE_CONTROL, media
+
+DIGEST = 'ab' + '0' * 62
+
+
+class MediaViewTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        for name in (f'posts/ab/{DIGEST}.gif',
+                     f'posts/variants/ab/{DIGEST}.webp',
+                     'posts/small.gif'):
+            path = os.path.join(cls.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(b'GIF89a')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.root, ignore_errors=True)
+
+    def get(self, path):
+        request = RequestFactory().get(f'/media/{path}')
+        return media(request, path, document_root=self.root)
+
+    def test_only_hashed_names_are_immutable(self):
+        """Навсегда кэшируются только файлы с хешем содержимого в имени."""
+        for path in (f'posts/ab/{DIGEST}.gif',
+                     f'posts/variants/ab/{DIGEST}.webp'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path)['Cache-Control'],
+                                 IMMUTABLE_CACHE_CONTROL)
+        response = self.get('posts/small.gif')
+        self.assertNotEqual(response.get('Cache-Control'),
+                            IMMUTABLE_CACHE_CONTROL)
@@ -1,4 +1,20 @@
+import hmac
+import re
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.views.static import serve
+
+from .metrics import exposition
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Имена из posts.storage: posts/<2 hex>/<sha256>.<ext>, у вариантов —
+# posts/variants/<2 hex>/<sha256>.<ext>.
+HASHED_MEDIA_RE = re.compile(
+    r'posts/(?:variants/)?(?P<prefix>[0-9a-f]{2})/'
+    r'(?P=prefix)[0-9a-f]{62}\.[a-z]+'
+)
 
 
 def page_not_found(request, exception):
@@ -11,3 +27,32 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def media(request, path, document_root=None):
+    """Медиафайлы при DEBUG; картинки постов кэшируются навсегда.
+
+    Имена картинок постов — хеши содержимого, файл под таким именем
+    никогда не меняется. Остальные файлы под posts/ (например,
+    загруженные до перехода на такие имена) кэшируются как обычно.
+    """
+    response = serve(request, path, document_root=document_root)
+    if HASHED_MEDIA_RE.fullmatch(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def metrics(request):
+    """Метрики для Prometheus; нужен токен из METRICS_TOKEN.
+
+    Адрес клиента не проверяем: за прокси на той же машине он всегда
+    локальный.
+    """
+    token = settings.METRICS_TOKEN
+    if not token or not hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    ):
+        raise Http404
+    return HttpResponse(
+        exposition(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
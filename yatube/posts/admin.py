@@ -1,5 +1,8 @@
 from django.contrib import admin
+
+from .caching import SITE_FEED, bump_version
 from .models import Group, Post
+from .search import get_backend as search_backend
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -15,6 +18,30 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return search_backend().matching_posts(queryset, search_term), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    readonly_fields = ('posts_count',)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_version(SITE_FEED)
+        bump_version('group_name', obj.pk)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_version(SITE_FEED)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_version(SITE_FEED)
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
@@ -0,0 +1,219 @@
+"""Нагрузочный замер лент и записи.
+
+Запросы идут через django.test.Client в том же процессе: сервер не
+нужен, а в замер входит всё, что делает Django, — middleware, view,
+шаблоны, кэш и SQL. Каждый сценарий гоняется отдельно заданным числом
+потоков, для него считаются перцентили задержки, пропускная
+способность и число SQL-запросов на запрос. С memory=True сценарий идёт
+под tracemalloc и к результату добавляется пик памяти, выделенной за
+этот сценарий; трассировка замедляет запросы, поэтому она по запросу.
+Результат — словарь, который команда benchmark сохраняет в JSON для
+сравнения между коммитами.
+"""
+import platform
+import random
+import subprocess
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Follow, Group, Post, User
+
+ENDPOINTS = (
+    'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+    'post_create', 'add_comment',
+)
+PERCENTILES = (50, 95, 99)
+TARGETS_LIMIT: int = 1000
+FEED_PAGES: int = 5
+
+
+class Targets:
+    """Объекты, к которым обращаются сценарии, выбранные из базы."""
+
+    def __init__(self, limit=TARGETS_LIMIT):
+        self.usernames = list(User.objects.filter(
+            posts__isnull=False
+        ).distinct().values_list('username', flat=True)[:limit])
+        self.readers = list(User.objects.filter(
+            pk__in=Follow.objects.values('user_id')[:limit]
+        ))
+        self.group_ids = list(Group.objects.values_list('pk', 'slug')[:limit])
+        self.post_ids = list(Post.objects.values_list('pk', flat=True)[:limit])
+        if not (self.usernames and self.readers and self.group_ids):
+            raise ValueError('В базе нет данных для замеров')
+
+
+def make_request(name, rng, targets):
+    """Метод, адрес и данные очередного запроса сценария name."""
+    page = {'page': rng.randint(1, FEED_PAGES)}
+    if name == 'index':
+        return 'get', reverse('posts:index'), page
+    if name == 'group_posts':
+        slug = rng.choice(targets.group_ids)[1]
+        return 'get', reverse('posts:group_list', args=[slug]), page
+    if name == 'profile':
+        username = rng.choice(targets.usernames)
+        return 'get', reverse('posts:profile', args=[username]), page
+    if name == 'post_detail':
+        post_id = rng.choice(targets.post_ids)
+        return 'get', reverse('posts:post_detail', args=[post_id]), {}
+    if name == 'follow_index':
+        return 'get', reverse('posts:follow_index'), {}
+    if name == 'post_create':
+        return 'post', reverse('posts:post_create'), {
+            'text': f'Замер {rng.random()}',
+            'group': rng.choice(targets.group_ids)[0],
+        }
+    if name == 'add_comment':
+        post_id = rng.choice(targets.post_ids)
+        return 'post', reverse('posts:add_comment', args=[post_id]), {
+            'text': f'Замер {rng.random()}',
+        }
+    raise ValueError(f'Неизвестный сценарий {name}')
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_worker(name, requests, targets, seed):
+    """Выполняет requests запросов; возвращает (мс, запросов к БД, ошибка)."""
+    rng = random.Random(seed)
+    client = Client()
+    client.force_login(rng.choice(targets.readers))
+    samples = []
+    try:
+        for _ in range(requests):
+            method, url, data = make_request(name, rng, targets)
+            counter = QueryCounter()
+            start = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                try:
+                    status = getattr(client, method)(url, data).status_code
+                except Exception:
+                    status = None
+            elapsed = (time.perf_counter() - start) * 1000
+            samples.append((elapsed, counter.count, status not in (200, 302)))
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+    return samples
+
+
+def percentile(sorted_values, percent):
+    """Перцентиль по ближайшему рангу."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-percent * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def run_endpoint(name, requests, concurrency, targets, seed=0, warmup=0,
+                 memory=False):
+    if warmup:
+        run_worker(name, warmup, targets, seed - 1)
+    per_worker = [requests // concurrency] * concurrency
+    for index in range(requests % concurrency):
+        per_worker[index] += 1
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if concurrency == 1:
+        samples = run_worker(name, requests, targets, seed)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(run_worker, name, count, targets, seed + index)
+                for index, count in enumerate(per_worker)
+            ]
+            samples = [sample for future in futures
+                       for sample in future.result()]
+    duration = time.perf_counter() - start
+    if memory:
+        # Пик считается от начала трассировки, то есть только за этот
+        # сценарий, а не за всю жизнь процесса, как ru_maxrss.
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    latencies = sorted(sample[0] for sample in samples)
+    result = {
+        'requests': len(samples),
+        'errors': sum(sample[2] for sample in samples),
+        'mean_ms': round(mean(latencies), 2),
+        'rps': round(len(samples) / duration, 1),
+        'queries_per_request': round(
+            mean([sample[1] for sample in samples]), 1
+        ),
+    }
+    if memory:
+        result['peak_alloc_kb'] = peak // 1024
+    for percent in PERCENTILES:
+        result[f'p{percent}_ms'] = round(percentile(latencies, percent), 2)
+    return result
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(endpoints=ENDPOINTS, requests=200, concurrency=4, seed=0, warmup=10,
+        memory=False):
+    targets = Targets()
+    return {
+        'commit': current_commit(),
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'params': {
+            'requests': requests,
+            'concurrency': concurrency,
+            'seed': seed,
+            'warmup': warmup,
+            'memory': memory,
+        },
+        'endpoints': {
+            name: run_endpoint(name, requests, concurrency, targets,
+                               seed, warmup, memory)
+            for name in endpoints
+        },
+    }
+
+
+def compare(previous, current):
+    """Строки с изменением p95 и числа SQL-запросов по сценариям."""
+    lines = []
+    for name, result in current['endpoints'].items():
+        before = previous.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / (
+            before['p95_ms'] or 1
+        ) * 100
+        lines.append(
+            f"{name}: p95 {before['p95_ms']} → {result['p95_ms']} мс "
+            f"({change:+.1f}%), SQL {before['queries_per_request']} → "
+            f"{result['queries_per_request']}"
+        )
+    return lines
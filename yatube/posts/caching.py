@@ -0,0 +1,63 @@
+"""Версии кэшированных фрагментов лент и страниц постов.
+
+Каждая лента (главная, группа, автор, пост, комментарии поста) имеет
+счётчик версии в кэше. Версия входит в ключ фрагмента, поэтому для
+сброса достаточно увеличить счётчик — старые фрагменты просто перестают
+читаться.
+"""
+import time
+
+from django.core.cache import cache
+
+FEED_CACHE_TIMEOUT: int = 60 * 15
+SITE_FEED: str = 'site'
+
+
+def version_key(feed, pk=None):
+    if pk is None:
+        return f'feed_version:{feed}'
+    return f'feed_version:{feed}:{pk}'
+
+
+def initial_version():
+    # Начальная версия берётся из времени, чтобы после вытеснения
+    # счётчика из кэша не совпасть со старыми фрагментами.
+    return int(time.time() * 1000)
+
+
+def get_versions(keys):
+    """Версии по ключам одним get_many; отсутствующие заводятся."""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = initial_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key)
+            versions[key] = version
+    return versions
+
+
+def feed_version(*feeds):
+    """Строка версий для ключа фрагмента: ('group', 3), ('index',) ..."""
+    keys = [version_key(*feed) for feed in ((SITE_FEED,),) + feeds]
+    versions = get_versions(keys)
+    return '|'.join(f'{key}={versions[key]}' for key in keys)
+
+
+def bump_version(feed, pk=None):
+    key = version_key(feed, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, initial_version(), None)
+
+
+def bump_post_feeds(post, old_group_id=None):
+    """Сбрасывает фрагменты всех страниц, где показывается пост."""
+    bump_version('index')
+    bump_version('author', post.author_id)
+    if post.pk is not None:
+        bump_version('post', post.pk)
+    for group_id in {post.group_id, old_group_id}:
+        if group_id is not None:
+            bump_version('group', group_id)
@@ -0,0 +1,73 @@
+"""Ветки комментариев на материализованных путях.
+
+Страница обсуждения — это первые корневые комментарии и первые
+REPLIES_IN_THREAD ответов каждой ветки. Ответы нумеруются внутри ветки
+(Comment.position), поэтому вся страница читается одним запросом по
+индексам (post, depth, created) и (thread, position), без рекурсии.
+"""
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+
+from .models import Comment
+from .paginators import (CURSOR_NEXT, CommentPaginator, CursorPage,
+                         decode_cursor)
+
+REPLIES_IN_THREAD: int = 3
+SUBTREE_LIMIT: int = 200
+
+
+def comment_threads(post, token, per_page, replies=REPLIES_IN_THREAD):
+    """Страница веток: корни с ``shown_replies`` и ``more_replies``."""
+    paginator = CommentPaginator(post.comments.filter(depth=0), per_page)
+    roots = paginator.ordered()
+    has_previous = False
+    if token:
+        try:
+            direction, created, pk = decode_cursor(token)
+        except InvalidPage:
+            direction = None
+        if direction == CURSOR_NEXT:
+            roots = paginator.keyset(roots, created, pk, forward=True)
+            has_previous = True
+    root_ids = roots.values('pk')[:per_page + 1]
+    comments = Comment.objects.filter(
+        Q(pk__in=root_ids) | Q(thread__in=root_ids, position__lte=replies)
+    ).select_related('author')
+    roots, thread_replies = [], {}
+    for comment in sorted(comments, key=lambda c: c.path):
+        if comment.depth == 0:
+            roots.append(comment)
+        else:
+            thread_replies.setdefault(comment.thread_id, []).append(comment)
+    roots.sort(key=lambda c: (c.created, c.pk))
+    for root in roots:
+        root.shown_replies = thread_replies.get(root.pk, [])
+        root.more_replies = root.last_position > len(root.shown_replies)
+    return CursorPage(
+        roots[:per_page], paginator,
+        has_next=len(roots) > per_page,
+        has_previous=has_previous,
+    )
+
+
+def subtree_descendants(comment):
+    """Ответы на комментарий любой глубины, в порядке дерева.
+
+    Поддерево — диапазон path > префикс AND path < префикс с увеличенным
+    последним символом: в отличие от LIKE 'префикс%' (path__startswith)
+    такое условие SQLite читает по индексу (post, path).
+    """
+    if not comment.path:
+        return Comment.objects.none()
+    upper = comment.path[:-1] + chr(ord(comment.path[-1]) + 1)
+    return Comment.objects.filter(
+        post_id=comment.post_id,
+        path__gt=comment.path,
+        path__lt=upper,
+    ).order_by('path')
+
+
+def comment_subtree(comment):
+    """Комментарий и его ответы в порядке дерева (не больше лимита)."""
+    descendants = subtree_descendants(comment).select_related('author')
+    return [comment] + list(descendants[:SUBTREE_LIMIT])
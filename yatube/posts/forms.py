@@ -9,6 +9,16 @@ class PostForm(forms.ModelForm):
         help_texts = {'group': 'Выберите группу', 'text': 'Введите ссообщение'}
         fields = ('text', 'group', 'image')
 
+    def clean(self):
+        cleaned_data = super().clean()
+        upload_error = getattr(self.files.get('image'), 'upload_error', None)
+        if upload_error:
+            # Вместо файла пришла пустая заглушка, и ImageField уже
+            # пожаловался на неё; показываем настоящую причину отказа.
+            self._errors.pop('image', None)
+            self.add_error('image', upload_error)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -16,3 +26,21 @@ class CommentForm(forms.ModelForm):
         labels = {'text': 'Добавить комментарий'}
         help_texts = {'text': 'Текст комментария'}
         fields = ('text',)
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.post = post
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Родитель приходит скрытым полем parent вне полей формы.
+        # Отвечать можно только на комментарии этого же поста.
+        parent_id = self.data.get('parent')
+        if parent_id:
+            parent = None
+            if self.post is not None and parent_id.isdigit():
+                parent = self.post.comments.filter(pk=parent_id).first()
+            if parent is None:
+                raise forms.ValidationError('Комментарий не найден.')
+            self.instance.parent = parent
+        return cleaned_data
@@ -0,0 +1,66 @@
+"""Готовый HTML карточек постов для лент.
+
+Карточка (posts/includes/article.html) рендерится один раз и хранится в
+кэше под ключом из pk поста, варианта карточки и версий: поста (растёт
+при правке, новой миниатюре), названия группы и имени автора. Страница
+ленты склеивает карточки из кэша и рендерит только отсутствующие.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.metrics import cache_requests
+
+from .caching import get_versions, version_key
+from .thumbnails import preload_thumbnails
+
+ARTICLE_TEMPLATE: str = 'posts/includes/article.html'
+ARTICLE_TIMEOUT: int = 60 * 60 * 24
+
+
+def article_version_keys(post):
+    keys = [
+        version_key('post', post.pk),
+        version_key('user_name', post.author_id),
+    ]
+    if post.group_id is not None:
+        keys.append(version_key('group_name', post.group_id))
+    return keys
+
+
+def article_key(post, variant, versions):
+    parts = [str(versions[key]) for key in article_version_keys(post)]
+    return f"article:{post.pk}:{variant}:{':'.join(parts)}"
+
+
+def preload_articles(posts, **flags):
+    """Заполняет ``article_html`` у постов страницы.
+
+    Флаги шаблона карточки (profile, without_group_links) входят в
+    ключ. Карточку с заглушкой вместо миниатюры не кэшируем: иначе
+    она пережила бы построение миниатюры.
+    """
+    posts = list(posts)
+    if not posts:
+        return
+    variant = ','.join(sorted(name for name, on in flags.items() if on))
+    versions = get_versions(list({
+        key for post in posts for key in article_version_keys(post)
+    }))
+    keys = {post.pk: article_key(post, variant, versions) for post in posts}
+    cached = cache.get_many(list(keys.values()))
+    missing = [post for post in posts if keys[post.pk] not in cached]
+    cache_requests.inc(len(posts) - len(missing), cache='article',
+                       result='hit')
+    cache_requests.inc(len(missing), cache='article', result='miss')
+    preload_thumbnails(missing)
+    rendered = {}
+    for post in missing:
+        html = render_to_string(ARTICLE_TEMPLATE, {'post': post, **flags})
+        cached[keys[post.pk]] = html
+        if not post.image or post.thumbnail_url is not None:
+            rendered[keys[post.pk]] = html
+    if rendered:
+        cache.set_many(rendered, ARTICLE_TIMEOUT)
+    for post in posts:
+        post.article_html = mark_safe(cached[keys[post.pk]])
@@ -0,0 +1,74 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+from posts.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу и замеряет задержку лент и записи; '
+            'пишет в базу, запускайте на отдельной копии')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=2,
+                            help='Комментариев на пост')
+        parser.add_argument('--follows', type=int, default=5,
+                            help='Подписок на пользователя')
+        parser.add_argument('--images', type=int, default=0,
+                            help='Сколько разных картинок раздать постам')
+        parser.add_argument('--skip-seed', action='store_true',
+                            help='Замерять на уже имеющихся данных')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на сценарий')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--memory', action='store_true',
+                            help='Замерять пик памяти сценария '
+                                 '(tracemalloc, медленнее)')
+        parser.add_argument('--endpoint', action='append',
+                            choices=benchmark.ENDPOINTS, dest='endpoints',
+                            help='Сценарий; по умолчанию все')
+        parser.add_argument('--output', help='Файл для результата в JSON')
+        parser.add_argument('--compare',
+                            help='JSON прошлого замера для сравнения')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('Нужны --requests и --concurrency больше 0')
+        if not options['skip_seed']:
+            Seeder(options['users'], options['groups'], options['posts'],
+                   comments=options['comments'], follows=options['follows'],
+                   images=options['images'], seed=options['seed'],
+                   defer_indexes=False).run()
+        results = benchmark.run(
+            endpoints=options['endpoints'] or benchmark.ENDPOINTS,
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            seed=options['seed'],
+            warmup=options['warmup'],
+            memory=options['memory'],
+        )
+        for name, result in results['endpoints'].items():
+            line = (
+                f"{name:<13} p50 {result['p50_ms']:>8} мс  "
+                f"p95 {result['p95_ms']:>8} мс  "
+                f"p99 {result['p99_ms']:>8} мс  "
+                f"{result['rps']:>7} rps  "
+                f"SQL {result['queries_per_request']:>5}  "
+                f"ошибок {result['errors']}"
+            )
+            if 'peak_alloc_kb' in result:
+                line += f"  память {result['peak_alloc_kb']} КБ"
+            self.stdout.write(line)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as previous:
+                for line in benchmark.compare(json.load(previous), results):
+                    self.stdout.write(line)
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.seeding import BATCH_SIZE, Seeder
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу сгенерированными пользователями, группами, '
+            'постами, комментариями и подписками')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=2,
+                            help='Комментариев на пост')
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на пользователя')
+        parser.add_argument('--images', type=int, default=0,
+                            help='Сколько разных картинок раздать постам')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--keep-indexes', action='store_true',
+                            help='Не снимать индексы на время загрузки')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['batch_size'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и batch > 0')
+        start = time.monotonic()
+
+        def log(message):
+            self.stdout.write(f'{time.monotonic() - start:8.1f} с  {message}')
+
+        Seeder(
+            options['users'], options['groups'], options['posts'],
+            comments=options['comments'], follows=options['follows'],
+            images=options['images'], seed=options['seed'],
+            batch_size=options['batch_size'],
+            defer_indexes=not options['keep_indexes'], log=log,
+        ).run()
+        self.stdout.write(self.style.SUCCESS('База заполнена'))
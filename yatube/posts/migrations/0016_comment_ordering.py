@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:24
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_tags_mentions'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ('created',)},
+        ),
+    ]
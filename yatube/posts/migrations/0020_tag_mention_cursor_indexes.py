@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_timeline_cursor_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='mention',
+            name='mention_user_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='posttag',
+            name='post_tag_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='mention',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='mention_user_date_post_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', '-pub_date', '-post'], name='post_tag_date_post_idx'),
+        ),
+    ]
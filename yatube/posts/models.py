@@ -1,13 +1,40 @@
+import json
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Greatest
+
+from .storage import post_image_storage
 
 User = get_user_model()
 
 
+COMMENT_MAX_DEPTH: int = 16
+PATH_STEP: int = 8
+
+
+def path_segment(pk):
+    """pk в base36 фиксированной ширины: строки сортируются как числа."""
+    digits = ''
+    while pk:
+        pk, digit = divmod(pk, 36)
+        digits = '0123456789abcdefghijklmnopqrstuvwxyz'[digit] + digits
+    return digits.rjust(PATH_STEP, '0')
+
+
+def counter_changes(deltas):
+    """Выражения UPDATE для счётчиков, не уходящих ниже нуля."""
+    return {
+        field: Greatest(models.F(field) + delta, 0)
+        for field, delta in deltas.items()
+    }
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
 
     def __str__(self):
         return self.title
@@ -39,17 +66,52 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_image_storage,
         blank=True
     )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='JSON: имя файла, ширина и тип каждого варианта',
+    )
 
     class Meta:
         ordering = ('-pub_date', )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            # id замыкает ключ курсора (дата, id) в порядке выборки.
+            models.Index(fields=['-pub_date', '-id'], name='post_date_id_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_id_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def image_sources(self):
+        """Наборы srcset по MIME-типам для тега <picture>."""
+        if not self.image or not self.image_variants:
+            return []
+        sources = {}
+        for variant in json.loads(self.image_variants):
+            sources.setdefault(variant['type'], []).append(
+                f"{self.image.storage.url(variant['name'])} "
+                f"{variant['width']}w"
+            )
+        return [
+            {'type': mime, 'srcset': ', '.join(srcset)}
+            for mime, srcset in sources.items()
+        ]
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -64,10 +126,98 @@ class Comment(models.Model):
     )
     text = models.TextField()
     created = models.DateTimeField('date published', auto_now_add=True)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        blank=True,
+        null=True,
+        verbose_name='Ответ на',
+    )
+    # Материализованный путь: pk предков и свой, по PATH_STEP символов.
+    # Сортировка по path даёт дерево в порядке обхода, а поддерево —
+    # это диапазон path между префиксом и следующей за ним строкой.
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    thread = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='+',
+        blank=True,
+        null=True,
+        editable=False,
+        help_text='Корневой комментарий ветки; у корня пусто',
+    )
+    position = models.PositiveIntegerField(
+        'Номер ответа в ветке', default=0, editable=False
+    )
+    last_position = models.PositiveIntegerField(
+        'Последний номер ответа', default=0, editable=False
+    )
+
+    class Meta:
+        ordering = ('created', )
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=['post', 'depth', 'created'],
+                name='comment_post_root_idx',
+            ),
+            models.Index(
+                fields=['post', 'path'], name='comment_post_path_idx'
+            ),
+            models.Index(
+                fields=['thread', 'position'], name='comment_thread_pos_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding and not self.path:
+                self.attach()
+
+    def attach(self):
+        """Вычисляет путь, глубину и номер в ветке после вставки."""
+        parent = self.parent
+        if parent is not None and parent.depth >= COMMENT_MAX_DEPTH:
+            # Слишком глубокий ответ становится соседом родителя.
+            parent = parent.parent
+            self.parent = parent
+        if parent is None:
+            self.path = path_segment(self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+            return
+        if not parent.path:
+            # Комментарий, созданный в обход save (bulk_create).
+            parent.path = path_segment(parent.pk)
+            Comment.objects.filter(pk=parent.pk).update(path=parent.path)
+        self.thread_id = parent.thread_id or parent.pk
+        self.depth = parent.depth + 1
+        self.path = parent.path + path_segment(self.pk)
+        with transaction.atomic():
+            # Строка корня блокируется до конца транзакции, иначе два
+            # параллельных ответа могут прочитать один и тот же номер.
+            # SQLite FOR UPDATE не знает, но там запись уже заблокирована
+            # вставкой комментария в той же транзакции (см. save).
+            threads = Comment.objects.select_for_update().filter(
+                pk=self.thread_id
+            )
+            self.position = threads.values_list(
+                'last_position', flat=True
+            ).get() + 1
+            threads.update(last_position=self.position)
+            Comment.objects.filter(pk=self.pk).update(
+                parent=parent, thread_id=self.thread_id, depth=self.depth,
+                path=self.path, position=self.position,
+            )
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -80,3 +230,224 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя (fan-out on write)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField('date published')
+
+    class Meta:
+        ordering = ('-pub_date', )
+        indexes = [
+            # Порядок ленты и ключ её курсора: (pub_date, post).
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_post_idx',
+            ),
+            models.Index(
+                fields=['user', 'author', '-pub_date'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_post'
+            ),
+        ]
+
+
+class Tag(models.Model):
+    name = models.CharField('Тег', max_length=50, unique=True)
+
+    class Meta:
+        verbose_name = 'Тег'
+        verbose_name_plural = 'Теги'
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class PostTag(models.Model):
+    """Тег поста; дата поста продублирована для ленты тега по индексу."""
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+    )
+    pub_date = models.DateTimeField('date published')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['tag', '-pub_date', '-post'],
+                name='post_tag_date_post_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'tag'], name='unique_post_tag'
+            ),
+        ]
+
+
+class Mention(models.Model):
+    """Упоминание пользователя в посте через @имя."""
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+    pub_date = models.DateTimeField('date published')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='mention_user_date_post_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'user'], name='unique_mention'
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики автора, обновляются сигналами."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'Статистика {self.user}'
+
+    @classmethod
+    def for_user(cls, user):
+        """Строка счётчиков пользователя; при отсутствии считается заново.
+
+        Принимает пользователя или его id.
+        """
+        user_id = getattr(user, 'pk', user)
+        stats = cls.objects.filter(user_id=user_id).first()
+        if stats is None:
+            stats, _ = cls.objects.get_or_create(
+                user_id=user_id,
+                defaults={
+                    'posts_count': Post.objects.filter(
+                        author_id=user_id).count(),
+                    'followers_count': Follow.objects.filter(
+                        author_id=user_id).count(),
+                    'following_count': Follow.objects.filter(
+                        user_id=user_id).count(),
+                    'comments_count': Comment.objects.filter(
+                        author_id=user_id).count(),
+                },
+            )
+        return stats
+
+    @classmethod
+    def bump(cls, user_id, **deltas):
+        """Атомарно изменяет счётчики на заданные приращения.
+
+        Если строки ещё нет, ничего не делает: for_user посчитает
+        актуальные значения при первом чтении.
+        """
+        cls.objects.filter(user_id=user_id).update(**counter_changes(deltas))
+
+
+class MediaBlob(models.Model):
+    """Счётчик ссылок постов на файл в хранилище картинок."""
+
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    refs = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def acquire(cls, name):
+        """Добавляет ссылку на файл, создавая строку при первой.
+
+        Приращение идёт одним UPDATE, поэтому не теряется, даже если
+        release удаляет строку между чтением и записью; строку создаём,
+        только когда обновлять нечего, а гонку двух создателей решает
+        уникальный индекс по имени.
+        """
+        with transaction.atomic():
+            if cls.objects.filter(name=name).update(
+                refs=models.F('refs') + 1
+            ):
+                return
+            try:
+                with transaction.atomic():
+                    cls.objects.create(name=name, refs=1)
+            except IntegrityError:
+                cls.objects.filter(name=name).update(
+                    refs=models.F('refs') + 1
+                )
+
+    @classmethod
+    def release(cls, name):
+        """Снимает ссылку; True, если она была последней."""
+        with transaction.atomic():
+            cls.objects.filter(name=name).update(
+                **counter_changes({'refs': -1})
+            )
+            deleted, _ = cls.objects.filter(name=name, refs=0).delete()
+        return bool(deleted)
@@ -0,0 +1,271 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_NEXT: str = 'n'
+CURSOR_PREVIOUS: str = 'p'
+PAGES_ON_EACH_SIDE: int = 2
+# С этой страницы лента листается курсорами, а не номерами страниц.
+CURSOR_FROM_PAGE: int = 5
+FEED_COUNT_TIMEOUT: int = 60 * 60
+
+
+def feed_count_key(feed, pk=None):
+    """Ключ кэша с числом постов ленты: index, group:<id>, author:<id>."""
+    if pk is None:
+        return f'feed_count:{feed}'
+    return f'feed_count:{feed}:{pk}'
+
+
+def approximate_count(queryset):
+    """Оценка числа строк по статистике PostgreSQL.
+
+    Работает только для нефильтрованной выборки; в остальных случаях
+    возвращает None, и вызывающий код считает точно.
+    """
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE relname = %s',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] <= 0:
+        return None
+    return int(row[0])
+
+
+def encode_cursor(obj, direction, date_field='pub_date', key_field='pk'):
+    """Упаковывает ключ (дата, id) записи в токен для URL."""
+    date = getattr(obj, date_field).isoformat()
+    raw = f'{direction}|{date}|{getattr(obj, key_field)}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора в (direction, pub_date, id)."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidPage('Некорректный курсор')
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or pub_date is None:
+        raise InvalidPage('Некорректный курсор')
+    return direction, pub_date, pk
+
+
+class FeedPaginator(Paginator):
+    """Пагинатор ленты с ограниченным окном номеров страниц.
+
+    Страница получает атрибут ``page_window`` — номера соседних страниц
+    вокруг текущей. Первая и последняя страницы выводятся шаблоном
+    отдельно, поэтому размер навигации не зависит от числа страниц.
+    Если передан ``cursor_from_page``, номерные ссылки не ведут дальше
+    этой страницы: глубже лента листается курсорами, а не OFFSET.
+
+    Если передан ``count_key``, число постов берётся из кэша и
+    пересчитывается только после его сброса (см. posts.signals).
+    """
+
+    on_each_side = PAGES_ON_EACH_SIDE
+
+    def __init__(self, object_list, per_page, count_key=None,
+                 cursor_from_page=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.cursor_from_page = cursor_from_page
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return super().count
+        count = cache.get(self.count_key)
+        if count is None:
+            if getattr(settings, 'POSTS_APPROXIMATE_COUNT', False):
+                count = approximate_count(self.object_list)
+            if count is None:
+                count = super().count
+            cache.set(self.count_key, count, FEED_COUNT_TIMEOUT)
+        return count
+
+    @cached_property
+    def last_numbered_page(self):
+        if self.cursor_from_page is None:
+            return self.num_pages
+        return min(self.num_pages, self.cursor_from_page)
+
+    @cached_property
+    def links_last_page(self):
+        """Ссылаться ли на последнюю страницу: только если она не глубокая."""
+        return self.last_numbered_page == self.num_pages
+
+    def get_page_window(self, number):
+        first = max(number - self.on_each_side, 1)
+        last = min(number + self.on_each_side, self.last_numbered_page)
+        return range(first, last + 1)
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        page.page_window = self.get_page_window(page.number)
+        return page
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации: вместо номеров — токены соседей.
+
+    ``object_list`` может быть ленивой выборкой на per_page + 1 строк:
+    запрос выполняется при первом обращении к постам или флагам, так что
+    при попадании в кэш фрагмента страница не читается вовсе. Флаг, не
+    переданный явно, определяется по лишней строке; для выборки назад
+    (``backward``) строки разворачиваются.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next=None,
+                 has_previous=None, backward=False, number=None):
+        self.number = number
+        self.paginator = paginator
+        self._rows = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self._backward = backward
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    @cached_property
+    def _fetched(self):
+        rows = list(self._rows)
+        has_more = len(rows) > self.paginator.per_page
+        rows = rows[:self.paginator.per_page]
+        if self._backward:
+            rows.reverse()
+        return rows, has_more
+
+    @property
+    def object_list(self):
+        return self._fetched[0]
+
+    def has_next(self):
+        if self._has_next is None:
+            return self._fetched[1]
+        return self._has_next
+
+    def has_previous(self):
+        if self._has_previous is None:
+            return self._fetched[1]
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return self.paginator.encode(self.object_list[-1], CURSOR_NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous() or not self.object_list:
+            return None
+        return self.paginator.encode(self.object_list[0], CURSOR_PREVIOUS)
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id).
+
+    Не выполняет COUNT(*) и OFFSET: каждая страница — это диапазон
+    по составному индексу (дата, id) от ключа последнего (или первого)
+    поста соседней страницы, поэтому время выборки не зависит от
+    глубины страницы.
+
+    Поля ключа и направление задаются атрибутами ``date_field``,
+    ``key_field`` и ``descending`` (по умолчанию — новые посты первыми)
+    или одноимёнными аргументами. Поля могут быть аннотациями, например
+    датой строки ленты, по индексу которой идёт выборка.
+    """
+
+    date_field = 'pub_date'
+    key_field = 'pk'
+    descending = True
+
+    def __init__(self, object_list, per_page, date_field=None,
+                 key_field=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.date_field = date_field or self.date_field
+        self.key_field = key_field or self.key_field
+
+    def encode(self, obj, direction):
+        return encode_cursor(obj, direction, self.date_field, self.key_field)
+
+    def keyset(self, queryset, date, pk, forward):
+        lookup = 'lt' if forward == self.descending else 'gt'
+        # Сравнение только по дате СУБД превращает в диапазон по индексу;
+        # равные даты отсекаются по id уже на строках этого диапазона.
+        # Без него OR из двух условий ведёт к MULTI-INDEX OR и сортировке
+        # всех строк за курсором.
+        return queryset.filter(
+            Q(**{f'{self.date_field}__{lookup}e': date}),
+            Q(**{f'{self.date_field}__{lookup}': date})
+            | Q(**{self.date_field: date, f'{self.key_field}__{lookup}': pk}),
+        )
+
+    def ordered(self):
+        sign = '-' if self.descending else ''
+        return self.object_list.order_by(
+            f'{sign}{self.date_field}', f'{sign}{self.key_field}'
+        )
+
+    def get_cursor_page(self, token=None):
+        queryset = self.ordered()
+        if not token:
+            return CursorPage(queryset[:self.per_page + 1], self,
+                              has_previous=False)
+        direction, date, pk = decode_cursor(token)
+        if direction == CURSOR_NEXT:
+            return CursorPage(
+                self.keyset(queryset, date, pk, forward=True)
+                [:self.per_page + 1],
+                self, has_previous=True,
+            )
+        return CursorPage(
+            self.keyset(queryset.reverse(), date, pk, forward=False)
+            [:self.per_page + 1],
+            self, has_next=True, backward=True,
+        )
+
+    def get_offset_page(self, number):
+        """Номерная страница без COUNT(*): OFFSET и курсоры соседей.
+
+        Нужна только как точка входа вглубь ленты; дальше навигация идёт
+        по курсорам.
+        """
+        offset = (number - 1) * self.per_page
+        return CursorPage(
+            self.ordered()[offset:offset + self.per_page + 1], self,
+            has_previous=True, number=number,
+        )
+
+    def get_page(self, token):
+        """Возвращает страницу по токену, при ошибке — первую страницу."""
+        try:
+            return self.get_cursor_page(token)
+        except InvalidPage:
+            return self.get_cursor_page()
+
+
+class CommentPaginator(CursorPaginator):
+    """Курсорные страницы комментариев, от старых к новым."""
+
+    date_field = 'created'
+    descending = False
@@ -0,0 +1,218 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Индекс обновляется сигналами при сохранении и удалении постов и
+комментариев. На SQLite это таблица FTS5: у поста rowid = 2 * pk, у
+комментария 2 * pk + 1, так что любая запись удаляется по rowid без
+просмотра таблицы. Для других СУБД бэкенд задаётся настройкой
+POSTS_SEARCH_BACKEND; встроенный запасной вариант ищет через LIKE.
+"""
+import abc
+from functools import reduce
+from operator import and_
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+SEARCH_TABLE: str = 'posts_search'
+POST_WEIGHT: float = 1.0
+# bm25 в FTS5 отрицательный: меньший множитель — слабее совпадение.
+COMMENT_WEIGHT: float = 0.5
+
+
+def search_terms(query):
+    return query.split()
+
+
+class SearchBackend(abc.ABC):
+    """Интерфейс бэкенда поиска; методы индексации по умолчанию пустые."""
+
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, post):
+        pass
+
+    def index_comment(self, comment):
+        pass
+
+    def remove_comment(self, comment):
+        pass
+
+    def rebuild(self):
+        pass
+
+    @abc.abstractmethod
+    def count(self, query):
+        """Число найденных постов."""
+
+    @abc.abstractmethod
+    def ranked_ids(self, query, offset, limit):
+        """pk найденных постов, от самых релевантных."""
+
+    @abc.abstractmethod
+    def matching_posts(self, queryset, query):
+        """Найденные посты из queryset, без ранжирования.
+
+        Поиск остаётся подзапросом в той же выборке: pk найденных
+        постов в Python не читаются.
+        """
+
+
+class SqliteFtsBackend(SearchBackend):
+    def match_expression(self, query):
+        # Каждое слово в кавычках: синтаксис FTS5 из запроса не
+        # интерпретируется, слова объединяются через AND.
+        return ' '.join(
+            '"{}"'.format(term.replace('"', '""'))
+            for term in search_terms(query)
+        )
+
+    def write(self, rowid, body, post_id, weight):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {SEARCH_TABLE}'
+                f'(rowid, body, post_id, weight) VALUES (%s, %s, %s, %s)',
+                [rowid, body, post_id, weight],
+            )
+
+    def delete(self, rowid):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [rowid]
+            )
+
+    def index_post(self, post):
+        self.write(2 * post.pk, post.text, post.pk, POST_WEIGHT)
+
+    def remove_post(self, post):
+        self.delete(2 * post.pk)
+
+    def index_comment(self, comment):
+        self.write(2 * comment.pk + 1, comment.text, comment.post_id,
+                   COMMENT_WEIGHT)
+
+    def remove_comment(self, comment):
+        self.delete(2 * comment.pk + 1)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE}(rowid, body, post_id, weight) '
+                f'SELECT 2 * id, text, id, %s FROM posts_post',
+                [POST_WEIGHT],
+            )
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE}(rowid, body, post_id, weight) '
+                f'SELECT 2 * id + 1, text, post_id, %s FROM posts_comment',
+                [COMMENT_WEIGHT],
+            )
+
+    def fetch_ids(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def count(self, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(DISTINCT post_id) FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s',
+                [expression],
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, query, offset, limit):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        # LIMIT -1 не даёт SQLite развернуть подзапрос: bm25 можно
+        # вызывать только прямо в запросе к FTS-таблице.
+        return self.fetch_ids(
+            f'SELECT post_id FROM ('
+            f'SELECT post_id, bm25({SEARCH_TABLE}) * weight AS score '
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s LIMIT -1'
+            f') GROUP BY post_id ORDER BY MIN(score), post_id DESC '
+            f'LIMIT %s OFFSET %s',
+            [expression, limit, offset],
+        )
+
+    def matching_posts(self, queryset, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return queryset.none()
+        pk = '{}.{}'.format(
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name(queryset.model._meta.pk.column),
+        )
+        return queryset.extra(
+            where=[
+                f'{pk} IN (SELECT post_id FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s)'
+            ],
+            params=[expression],
+        )
+
+
+class LikeBackend(SearchBackend):
+    """Запасной поиск без индекса: все слова через LIKE, новые выше."""
+
+    def queryset(self, query):
+        terms = search_terms(query)
+        if not terms:
+            return Post.objects.none()
+        return Post.objects.filter(reduce(and_, (
+            Q(text__icontains=term) | Q(comments__text__icontains=term)
+            for term in terms
+        ))).distinct()
+
+    def count(self, query):
+        return self.queryset(query).count()
+
+    def ranked_ids(self, query, offset, limit):
+        ids = self.queryset(query).values_list('pk', flat=True)
+        return list(ids[offset:offset + limit])
+
+    def matching_posts(self, queryset, query):
+        return queryset.filter(pk__in=self.queryset(query).values('pk'))
+
+
+def get_backend():
+    path = settings.POSTS_SEARCH_BACKEND
+    if path is None:
+        if connection.vendor == 'sqlite':
+            return SqliteFtsBackend()
+        return LikeBackend()
+    return import_string(path)()
+
+
+class SearchResults:
+    """Найденные посты как ленивая последовательность для Paginator."""
+
+    def __init__(self, query, backend=None):
+        self.query = query
+        self.backend = backend or get_backend()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        ids = self.backend.ranked_ids(self.query, start, index.stop - start)
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
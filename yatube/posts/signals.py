@@ -0,0 +1,241 @@
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from sorl.thumbnail import delete as delete_thumbnails
+
+from .caching import SITE_FEED, bump_post_feeds, bump_version
+from .models import (AuthorStats, Comment, Follow, Group, MediaBlob, Post,
+                     User, counter_changes)
+from .paginators import feed_count_key
+from .search import get_backend as search_backend
+from .tags import post_tag_count_keys, sync_post_tags
+from .thumbnails import thumbnail_key
+from .timeline import (backfill_timeline, fan_out_post, timeline_count_keys,
+                       trim_timeline)
+
+
+def post_feed_count_keys(post, old_group_id=None):
+    """Ключи счётчиков всех лент, в которых показывается пост."""
+    keys = [
+        feed_count_key('index'),
+        feed_count_key('author', post.author_id),
+    ]
+    for group_id in {post.group_id, old_group_id}:
+        if group_id is not None:
+            keys.append(feed_count_key('group', group_id))
+    return keys
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            **counter_changes({'posts_count': delta})
+        )
+
+
+def release_image(name, variants=''):
+    """Снимает ссылку поста на картинку и удаляет файлы без ссылок."""
+    if not name or not MediaBlob.release(name):
+        return
+    names = [name] + [
+        variant['name'] for variant in json.loads(variants or '[]')
+    ]
+    storage = Post._meta.get_field('image').storage
+
+    def delete_files():
+        # Пока транзакция шла, файл мог снова понадобиться.
+        if not MediaBlob.objects.filter(name=name).exists():
+            # Миниатюры sorl и их записи в его хранилище ключей.
+            delete_thumbnails(name, delete_file=False)
+            cache.delete(thumbnail_key(name))
+            for file_name in names:
+                try:
+                    storage.delete(file_name)
+                except SuspiciousFileOperation:
+                    # Путь вне MEDIA_ROOT: файл не наш, не трогаем.
+                    pass
+
+    transaction.on_commit(delete_files)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_values(sender, instance, **kwargs):
+    if instance._state.adding or instance.pk is None:
+        return
+    old = (
+        Post.objects.filter(pk=instance.pk)
+        .values('group_id', 'image', 'image_variants', 'text')
+        .first()
+    )
+    if old is not None:
+        instance._old_group_id = old['group_id']
+        instance._old_text = old['text']
+        instance._old_image = (old['image'], old['image_variants'])
+        if instance.image.name != old['image']:
+            # Варианты старой картинки построит заново generate_thumbnail.
+            instance.image_variants = ''
+
+
+@receiver(post_save, sender=Post)
+def update_counters_on_post_save(sender, instance, created, **kwargs):
+    old_group_id = instance.__dict__.pop('_old_group_id', instance.group_id)
+    # Любое сохранение — из view, админки, shell или команды.
+    bump_post_feeds(instance, old_group_id)
+    if created:
+        AuthorStats.bump(instance.author_id, posts_count=1)
+        bump_group(instance.group_id, 1)
+        cache.delete_many(post_feed_count_keys(instance))
+    elif old_group_id != instance.group_id:
+        bump_group(old_group_id, -1)
+        bump_group(instance.group_id, 1)
+        cache.delete_many(post_feed_count_keys(instance, old_group_id))
+
+
+@receiver(post_delete, sender=Post)
+def update_counters_on_post_delete(sender, instance, **kwargs):
+    AuthorStats.bump(instance.author_id, posts_count=-1)
+    bump_group(instance.group_id, -1)
+    cache.delete_many(post_feed_count_keys(instance))
+
+
+@receiver(post_save, sender=Post)
+def update_image_refs_on_post_save(sender, instance, created, **kwargs):
+    name = instance.image.name or ''
+    old_name, old_variants = instance.__dict__.pop(
+        '_old_image', ('', '')
+    )
+    if created or name != old_name:
+        if name:
+            MediaBlob.acquire(name)
+        release_image(old_name, old_variants)
+
+
+@receiver(post_delete, sender=Post)
+def update_image_refs_on_post_delete(sender, instance, **kwargs):
+    release_image(instance.image.name, instance.image_variants)
+
+
+@receiver(post_save, sender=Comment)
+def update_counters_on_comment_save(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.bump(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def update_counters_on_comment_delete(sender, instance, **kwargs):
+    AuthorStats.bump(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comments_version(sender, instance, **kwargs):
+    # Отдельная версия: новый комментарий не сбрасывает карточку поста.
+    bump_version('post_comments', instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def update_counters_on_follow_save(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.bump(instance.author_id, followers_count=1)
+        AuthorStats.bump(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def update_counters_on_follow_delete(sender, instance, **kwargs):
+    AuthorStats.bump(instance.author_id, followers_count=-1)
+    AuthorStats.bump(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_on_post_save(sender, instance, created, **kwargs):
+    if created:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline_on_follow(sender, instance, created, **kwargs):
+    if created:
+        backfill_timeline(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline_on_unfollow(sender, instance, **kwargs):
+    trim_timeline(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def reset_timeline_counts(sender, instance, **kwargs):
+    keys = timeline_count_keys(instance)
+    if keys:
+        cache.delete_many(keys)
+
+
+@receiver(post_save, sender=Post)
+def index_post_on_save(sender, instance, **kwargs):
+    search_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_index(sender, instance, **kwargs):
+    search_backend().remove_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment_on_save(sender, instance, **kwargs):
+    search_backend().index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def remove_comment_from_index(sender, instance, **kwargs):
+    search_backend().remove_comment(instance)
+
+
+@receiver(post_save, sender=Post)
+def sync_tags_on_post_save(sender, instance, created, **kwargs):
+    old_text = instance.__dict__.pop('_old_text', None)
+    if created or instance.text != old_text:
+        sync_post_tags(instance, created)
+
+
+@receiver(pre_delete, sender=Post)
+def reset_tag_feed_counts(sender, instance, **kwargs):
+    keys = post_tag_count_keys(instance)
+    if keys:
+        cache.delete_many(keys)
+
+
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def remember_old_name(sender, instance, update_fields, **kwargs):
+    # Вход обновляет только last_login, имя автора при этом не меняется.
+    if instance._state.adding or update_fields == frozenset({'last_login'}):
+        return
+    instance._old_name = (
+        User.objects.filter(pk=instance.pk)
+        .values_list(*USER_NAME_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=User)
+def reset_articles_on_user_save(sender, instance, created, **kwargs):
+    old_name = instance.__dict__.pop('_old_name', None)
+    new_name = tuple(getattr(instance, field) for field in USER_NAME_FIELDS)
+    if created or old_name is None or old_name == new_name:
+        return
+    bump_version('user_name', instance.pk)
+    # Посты и комментарии автора есть на любых страницах: карточки
+    # пересоберутся по user_name, а страницы сбрасываются целиком.
+    bump_version(SITE_FEED)
+
+
+@receiver(post_delete, sender=Post)
+def reset_pages_on_post_delete(sender, instance, **kwargs):
+    # Любое удаление, в том числе каскадом вместе с автором.
+    bump_post_feeds(instance)
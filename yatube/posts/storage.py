@@ -0,0 +1,83 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого, поэтому одинаковые загрузки
+сводятся к одному файлу, а его URL никогда не меняется и может
+кэшироваться навсегда. Расширение берётся из формата картинки, а не из
+имени, присланного клиентом. Сколько постов ссылается на файл, хранит
+MediaBlob; файл удаляется, когда ссылок не остаётся.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from PIL import Image
+
+HASH_PREFIX_LENGTH: int = 2
+FORMAT_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'GIF': '.gif',
+    'WEBP': '.webp',
+    'AVIF': '.avif',
+}
+
+
+def detect_format(content):
+    """Формат картинки: из обработчика загрузки или по заголовку."""
+    image_format = getattr(content, 'image_format', None)
+    if image_format is not None:
+        return image_format
+    content.seek(0)
+    try:
+        with Image.open(content) as image:
+            return image.format
+    except Exception:
+        return None
+    finally:
+        content.seek(0)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Настоящее имя выбирает _save по содержимому, совпадение
+        # с существующим файлом — это и есть дедупликация.
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = FORMAT_EXTENSIONS.get(detect_format(content), '')
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(
+            dir=self.path(directory), suffix='.part'
+        )
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                directory, hexdigest[:HASH_PREFIX_LENGTH],
+                hexdigest + extension,
+            )
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+post_image_storage = ContentAddressedStorage()
@@ -0,0 +1,114 @@
+"""Теги (#тег) и упоминания (@имя) в тексте постов.
+
+Разбор идёт при создании поста и при изменении его текста, результат
+хранится в PostTag и Mention с продублированной датой поста: ленты тега
+и упоминаний читаются по индексу (tag, -pub_date, -post) и
+(user, -pub_date, -post), без поиска по тексту и без сортировки.
+"""
+import re
+
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Mention, Post, PostTag, Tag, User
+from .paginators import feed_count_key
+
+# Слово длиннее 50 символов не тег: не обрезаем его до первых 50.
+TAG_RE = re.compile(r'(?<![\w&#])#(\w{1,50})(?!\w)')
+MENTION_RE = re.compile(r'(?<![\w@])@(\w[\w.+-]*)')
+
+
+def extract_tags(text):
+    return {name.lower() for name in TAG_RE.findall(text)}
+
+
+def extract_mentions(text):
+    # Точка в конце — знак препинания, а не часть имени.
+    return {name.rstrip('.') for name in MENTION_RE.findall(text)}
+
+
+def sync_tags(post, created=False):
+    """Приводит теги поста к тексту; возвращает pk изменившихся тегов."""
+    names = extract_tags(post.text)
+    current = {} if created else dict(
+        PostTag.objects.filter(post=post).values_list('tag__name', 'tag_id')
+    )
+    stale = [tag_id for name, tag_id in current.items() if name not in names]
+    if stale:
+        PostTag.objects.filter(post=post, tag_id__in=stale).delete()
+    added = []
+    new_names = names - current.keys()
+    if new_names:
+        Tag.objects.bulk_create(
+            [Tag(name=name) for name in new_names], ignore_conflicts=True
+        )
+        added = list(
+            Tag.objects.filter(name__in=new_names).values_list('pk', flat=True)
+        )
+        PostTag.objects.bulk_create([
+            PostTag(post=post, tag_id=tag_id, pub_date=post.pub_date)
+            for tag_id in added
+        ])
+    return stale + added
+
+
+def sync_mentions(post, created=False):
+    """Приводит упоминания к тексту; возвращает pk изменившихся людей."""
+    usernames = extract_mentions(post.text)
+    current = set() if created else set(
+        Mention.objects.filter(post=post).values_list('user_id', flat=True)
+    )
+    wanted = set(
+        User.objects.filter(username__in=usernames)
+        .values_list('pk', flat=True)
+    ) if usernames else set()
+    stale = current - wanted
+    if stale:
+        Mention.objects.filter(post=post, user_id__in=stale).delete()
+    added = wanted - current
+    Mention.objects.bulk_create([
+        Mention(post=post, user_id=user_id, pub_date=post.pub_date)
+        for user_id in added
+    ])
+    return list(stale | added)
+
+
+def sync_post_tags(post, created=False):
+    """Обновляет теги и упоминания поста и сбрасывает счётчики их лент."""
+    keys = [feed_count_key('tag', pk) for pk in sync_tags(post, created)]
+    keys += [
+        feed_count_key('mention', pk)
+        for pk in sync_mentions(post, created)
+    ]
+    if keys:
+        cache.delete_many(keys)
+
+
+def post_tag_count_keys(post):
+    """Ключи счётчиков лент тегов и упоминаний, где показан пост."""
+    tag_ids = PostTag.objects.filter(post=post).values_list(
+        'tag_id', flat=True
+    )
+    user_ids = Mention.objects.filter(post=post).values_list(
+        'user_id', flat=True
+    )
+    return (
+        [feed_count_key('tag', pk) for pk in tag_ids]
+        + [feed_count_key('mention', pk) for pk in user_ids]
+    )
+
+
+def tag_posts(tag):
+    """Посты тега с ключом курсора строки PostTag (feed_date, feed_key)."""
+    return Post.objects.filter(post_tags__tag=tag).annotate(
+        feed_date=F('post_tags__pub_date'),
+        feed_key=F('post_tags__post_id'),
+    ).order_by('-feed_date', '-feed_key')
+
+
+def mention_posts(user):
+    """Посты с упоминанием пользователя, ключ курсора — строка Mention."""
+    return Post.objects.filter(mentions__user=user).annotate(
+        feed_date=F('mentions__pub_date'),
+        feed_key=F('mentions__post_id'),
+    ).order_by('-feed_date', '-feed_key')
@@ -0,0 +1,12 @@
+from django import template
+
+from ..fragments import preload_articles
+
+register = template.Library()
+
+
+@register.simple_tag
+def preload_post_articles(page_obj, **flags):
+    """Готовит HTML карточек страницы: из кэша или рендером."""
+    preload_articles(page_obj, **flags)
+    return ''
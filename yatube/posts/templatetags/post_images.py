@@ -0,0 +1,11 @@
+from django import template
+
+from ..thumbnails import ready_thumbnail_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Адрес готовой миниатюры поста или None, пока она строится."""
+    return ready_thumbnail_url(post)
@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from ..benchmark import ENDPOINTS, percentile, run_endpoint
+from ..models import Comment, Follow
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_command_reports_every_endpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            call_command(
+                'benchmark', users=5, groups=2, posts=30, requests=3,
+                concurrency=1, warmup=0, output=output,
+                stdout=open(os.devnull, 'w'),
+            )
+            with open(output) as source:
+                result = json.load(source)
+        self.assertEqual(list(result['endpoints']), list(ENDPOINTS))
+        for name, endpoint in result['endpoints'].items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(endpoint['requests'], 3)
+                self.assertEqual(endpoint['errors'], 0)
+                self.assertLessEqual(endpoint['p50_ms'], endpoint['p99_ms'])
+                self.assertGreater(endpoint['queries_per_request'], 0)
+
+    def test_seed_options_and_memory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            call_command(
+                'benchmark', users=5, groups=2, posts=30, comments=3,
+                follows=2, requests=2, concurrency=1, warmup=0,
+                endpoint=['index'], memory=True, output=output,
+                stdout=open(os.devnull, 'w'),
+            )
+            with open(output) as source:
+                result = json.load(source)
+        self.assertEqual(Comment.objects.count(), 30 * 3)
+        self.assertEqual(Follow.objects.count(), 5 * 2)
+        self.assertTrue(result['params']['memory'])
+        self.assertGreater(result['endpoints']['index']['peak_alloc_kb'], 0)
+
+    def test_empty_run(self):
+        """Пустой сценарий не делит на ноль, а команда его не запускает."""
+        targets = SimpleNamespace(
+            readers=[User.objects.create_user(username='reader')]
+        )
+        result = run_endpoint('index', 0, 1, targets)
+        self.assertEqual(result['requests'], 0)
+        self.assertEqual(result['mean_ms'], 0.0)
+        self.assertEqual(result['queries_per_request'], 0.0)
+        for option in ('requests', 'concurrency'):
+            with self.subTest(option=option):
+                with self.assertRaises(CommandError):
+                    call_command('benchmark', skip_seed=True,
+                                 **{option: 0})
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([5], 95), 5)
@@ -1,19 +1,41 @@
+import hashlib
+import io
+import os
 import shutil
+import struct
 import tempfile
+import zlib
+from unittest import mock
 
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.test import (Client, RequestFactory, TestCase,
+                         override_settings)
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
 
-from ..models import Group, Post, Comment
+from ..models import Group, MediaBlob, Post, Comment
 from ..forms import PostForm
+from ..uploads import JpegExifStripper, PostImageUploadHandler
+from ..thumbnails import (THUMBNAIL_GEOMETRY, THUMBNAIL_OPTIONS,
+                          VARIANT_WIDTHS, generate_thumbnail, thumbnail_key)
 
 User = get_user_model()
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -74,11 +96,12 @@ class PostFormTests(TestCase):
         self.assertRedirects(response, reverse(
             'posts:profile',
             kwargs={'username': self.post_author.username}))
+        digest = hashlib.sha256(small_gif).hexdigest()
         self.assertTrue(
             Post.objects.filter(
                 group=self.group.pk,
                 text='Данные из формы',
-                image='posts/small.gif'
+                image=f'posts/{digest[:2]}/{digest}.gif'
             ).exists()
         )
 
@@ -143,3 +166,243 @@ class PostFormTests(TestCase):
         self.assertTrue(
             Comment.objects.filter(text=form_data['text']).exists()
         )
+
+    def test_thumbnail_is_built_outside_render(self):
+        """Пока миниатюра не готова, страница показывает заглушку."""
+        cache.clear()
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.post_author,
+            image=SimpleUploadedFile('thumb.gif', SMALL_GIF, 'image/gif'),
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        response = self.guest_user.get(url)
+        self.assertNotContains(response, 'card-img my-2" src')
+        self.assertContains(response, 'bg-light')
+
+        generate_thumbnail(post)
+        thumbnail_url = cache.get(thumbnail_key(post.image.name))
+        self.assertIsNotNone(thumbnail_url)
+        response = self.guest_user.get(url)
+        self.assertContains(response, thumbnail_url)
+        post.refresh_from_db()
+        self.assertTrue(post.image_sources)
+        for width in VARIANT_WIDTHS:
+            self.assertContains(response, f'{width}w')
+
+    def test_feed_page_reads_thumbnails_in_one_batch(self):
+        """Миниатюры страницы ленты читаются одним get_many."""
+        for i in range(3):
+            Post.objects.create(
+                text=f'Картинка {i}',
+                author=self.post_author,
+                image=SimpleUploadedFile(f'batch{i}.gif', SMALL_GIF,
+                                         'image/gif'),
+            )
+        cache.clear()
+        with mock.patch('posts.thumbnails.cache') as thumbnails_cache:
+            thumbnails_cache.get_many.return_value = {}
+            self.guest_user.get(reverse('posts:index'))
+        thumbnails_cache.get_many.assert_called_once()
+        self.assertEqual(len(thumbnails_cache.get_many.call_args[0][0]), 3)
+        thumbnails_cache.get.assert_not_called()
+
+
+def png_chunk(chunk_type, data):
+    body = chunk_type + data
+    return (struct.pack('>I', len(data)) + body
+            + struct.pack('>I', zlib.crc32(body)))
+
+
+def png_header(width, height):
+    """PNG с заданными размерами и почти пустыми данными."""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', ihdr)
+            + png_chunk(b'IDAT', zlib.compress(b'\x00' * 64)))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, name, content, content_type):
+        return self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content, content_type),
+        })
+
+    def test_oversized_file_rejected(self):
+        """Файл больше лимита отклоняется с ошибкой формы."""
+        with mock.patch('posts.uploads.MAX_IMAGE_SIZE', 16):
+            response = self.upload('small.gif', SMALL_GIF, 'image/gif')
+        self.assertFormError(response, 'form', 'image', 'Файл больше 0 МБ.')
+        self.assertFalse(Post.objects.exists())
+
+    def test_decompression_bomb_rejected_by_header(self):
+        """Картинка с огромными размерами отклоняется по заголовку."""
+        response = self.upload('bomb.png', png_header(100000, 100000),
+                               'image/png')
+        self.assertFormError(response, 'form', 'image',
+                             'Изображение слишком большое по числу пикселей.')
+        self.assertFalse(Post.objects.exists())
+
+    def test_rejected_file_is_skipped_without_stopping(self):
+        """Остаток отклонённого файла пропускается, разбор не прерывается."""
+        handler = PostImageUploadHandler(RequestFactory().post('/'))
+        handler.new_file('image', 'bomb.png', 'image/png', None)
+        handler.receive_data_chunk(png_header(100000, 100000), 0)
+        handler.receive_data_chunk(b'\x00' * 1024, 0)
+        self.assertEqual(handler.written, 0)
+        rejected = handler.file_complete(handler.received)
+        self.assertEqual(rejected.upload_error,
+                         'Изображение слишком большое по числу пикселей.')
+
+    def test_fields_after_rejected_file_are_read(self):
+        """Поля, идущие в запросе после отклонённого файла, не теряются."""
+        boundary = 'BoUnDaRy'
+        body = '\r\n'.join([
+            f'--{boundary}',
+            'Content-Disposition: form-data; name="image"; '
+            'filename="bomb.png"',
+            'Content-Type: image/png',
+            '',
+        ]).encode() + b'\r\n' + png_header(100000, 100000) + '\r\n'.join([
+            '',
+            f'--{boundary}',
+            'Content-Disposition: form-data; name="text"',
+            '',
+            'Текст после файла',
+            f'--{boundary}--',
+            '',
+        ]).encode()
+        response = self.client.post(
+            reverse('posts:post_create'), body,
+            content_type=f'multipart/form-data; boundary={boundary}',
+        )
+        self.assertFormError(response, 'form', 'image',
+                             'Изображение слишком большое по числу пикселей.')
+        self.assertFormError(response, 'form', 'text', None)
+        self.assertEqual(response.context['form']['text'].value(),
+                         'Текст после файла')
+        self.assertFalse(Post.objects.exists())
+
+    def test_extension_follows_detected_format(self):
+        """Расширение файла берётся из формата, а не из имени клиента."""
+        self.upload('picture.png', SMALL_GIF, 'image/png')
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(Post.objects.get().image.name,
+                         f'posts/{digest[:2]}/{digest}.gif')
+
+    def test_handler_is_limited_to_post_views(self):
+        """Обработчик подключается только к созданию и правке постов."""
+        self.assertNotIn('posts.uploads.PostImageUploadHandler',
+                         settings.FILE_UPLOAD_HANDLERS)
+        post = Post.objects.create(text='Пост', author=self.user)
+        with mock.patch('posts.uploads.MAX_IMAGE_SIZE', 16):
+            response = self.client.post(
+                reverse('posts:post_edit', args=[post.pk]),
+                {'text': 'Правка', 'image': SimpleUploadedFile(
+                    'small.gif', SMALL_GIF, 'image/gif')},
+            )
+        self.assertFormError(response, 'form', 'image', 'Файл больше 0 МБ.')
+
+    def test_csrf_is_checked_after_handler_swap(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('posts:post_create'),
+                               {'text': 'Без токена'})
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.exists())
+
+    def test_not_an_image_rejected(self):
+        response = self.upload('text.gif', b'not an image', 'image/gif')
+        self.assertFormError(
+            response, 'form', 'image',
+            'Загрузите изображение в формате JPEG, PNG или GIF.',
+        )
+
+    def test_jpeg_exif_is_stripped(self):
+        """EXIF вырезается из JPEG при загрузке."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        content = io.BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(content, 'JPEG',
+                                             exif=exif.tobytes())
+        self.assertIn(b'Exif', content.getvalue())
+        self.upload('photo.jpg', content.getvalue(), 'image/jpeg')
+        post = Post.objects.get()
+        with post.image.open() as stored:
+            data = stored.read()
+        self.assertNotIn(b'Exif', data)
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertEqual(image.size, (8, 8))
+
+    def test_stripper_handles_split_chunks(self):
+        """Разбор JPEG не зависит от границ чанков."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        content = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(content, 'JPEG', exif=exif.tobytes())
+        stripper = JpegExifStripper()
+        data = content.getvalue()
+        result = b''.join(stripper.feed(data[i:i + 3])
+                          for i in range(0, len(data), 3))
+        result += stripper.flush()
+        self.assertNotIn(b'Exif', result)
+        self.assertEqual(result, JpegExifStripper().feed(data))
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом со счётчиком ссылок."""
+        for name in ('first.gif', 'second.gif'):
+            self.upload(name, SMALL_GIF, 'image/gif')
+        first, second = Post.objects.all()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).refs, 2)
+        path = first.image.path
+
+        with mock.patch('posts.signals.transaction.on_commit',
+                        side_effect=lambda callback: callback()):
+            first.delete()
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(
+                MediaBlob.objects.get(name=second.image.name).refs, 1
+            )
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_deleted_blob_drops_thumbnails(self):
+        """Вместе с последней ссылкой на файл удаляются его миниатюры."""
+        self.upload('small.gif', SMALL_GIF, 'image/gif')
+        post = Post.objects.get()
+        generate_thumbnail(post)
+        thumbnail = get_thumbnail(
+            post.image.name, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS
+        )
+        self.assertTrue(default_storage.exists(thumbnail.name))
+
+        with mock.patch('posts.signals.transaction.on_commit',
+                        side_effect=lambda callback: callback()):
+            post.delete()
+        self.assertFalse(default_storage.exists(thumbnail.name))
+        self.assertIsNone(cache.get(thumbnail_key(post.image.name)))
+
+    def test_acquire_after_last_release_recreates_blob(self):
+        """Ссылка, взятая после удаления строки, не теряется."""
+        MediaBlob.acquire('posts/blob.gif')
+        self.assertTrue(MediaBlob.release('posts/blob.gif'))
+        MediaBlob.acquire('posts/blob.gif')
+        MediaBlob.acquire('posts/blob.gif')
+        self.assertEqual(MediaBlob.objects.get(name='posts/blob.gif').refs, 2)
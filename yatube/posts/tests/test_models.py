@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 FIRST_SYMBOLS: int = 15
 
@@ -33,3 +33,51 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         expected_obj_name = post.text[:FIRST_SYMBOLS]
         self.assertEqual(expected_obj_name, str(post))
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='stats_author')
+        cls.reader = User.objects.create_user(username='stats_reader')
+        cls.group = Group.objects.create(
+            title='Группа счётчиков',
+            slug='stats_group',
+            description='Тестовое описание',
+        )
+
+    def test_stats_follow_writes(self):
+        """Счётчики автора и группы меняются вместе с данными."""
+        AuthorStats.for_user(self.author)
+        AuthorStats.for_user(self.reader)
+        post = Post.objects.create(author=self.author, group=self.group,
+                                   text='Пост для счётчиков')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        Follow.objects.create(user=self.reader, author=self.author)
+        author_stats = AuthorStats.objects.get(user=self.author)
+        reader_stats = AuthorStats.objects.get(user=self.reader)
+        self.group.refresh_from_db()
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+        self.assertEqual(reader_stats.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+
+        post.group = None
+        post.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        post.delete()
+        Follow.objects.filter(user=self.reader).delete()
+        author_stats.refresh_from_db()
+        reader_stats.refresh_from_db()
+        self.assertEqual(author_stats.posts_count, 0)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertEqual(reader_stats.comments_count, 0)
+
+    def test_missing_stats_are_recounted(self):
+        """Отсутствующая строка счётчиков создаётся по реальным данным."""
+        Post.objects.create(author=self.author, text='Пост без счётчиков')
+        AuthorStats.objects.filter(user=self.author).delete()
+        self.assertEqual(AuthorStats.for_user(self.author).posts_count, 1)
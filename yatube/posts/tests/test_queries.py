@@ -0,0 +1,203 @@
+import re
+from contextlib import contextmanager
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..comments import SUBTREE_LIMIT, subtree_descendants
+from ..models import Comment, Follow, Group, Post, Tag
+from ..paginators import CursorPaginator
+from ..tags import mention_posts, tag_posts
+from ..timeline import timeline_posts
+from ..views import POSTS_IN_PAGE
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?(\w+)$')
+SAVEPOINT_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 7,
+    'posts:post_detail': 5,
+    'posts:follow_index': 5,
+}
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryBudgetMixin:
+    """Проверка, что код укладывается в заданное число SQL-запросов."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, msg=None):
+        """Учитываются только запросы к данным.
+
+        Точки сохранения и запросы кэша в таблице БД (YATUBE_CACHE=db)
+        не считаются.
+        """
+        cache_tables = [
+            params['LOCATION'] for params in settings.CACHES.values()
+            if params['BACKEND'].endswith('DatabaseCache')
+        ]
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if not query['sql'].startswith(SAVEPOINT_STATEMENTS)
+            and not any(table in query['sql'] for table in cache_tables)
+        ]
+        executed = len(queries)
+        queries = '\n'.join(queries)
+        self.assertLessEqual(
+            executed, budget,
+            msg or f'{executed} запросов вместо {budget}:\n{queries}',
+        )
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса в формате SQLite')
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='plan_author')
+        cls.reader = User.objects.create_user(username='plan_reader')
+        cls.group = Group.objects.create(title='Группа', slug='plan_group')
+        cls.post = Post.objects.create(
+            text='Пост #план для @plan_reader', author=cls.user,
+            group=cls.group,
+        )
+        cls.tag = Tag.objects.get(name='план')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def assertNoFullScan(self, queryset):
+        for step in query_plan(queryset):
+            with self.subTest(step=step):
+                self.assertIsNone(FULL_SCAN.search(step), step)
+                self.assertNotIn('TEMP B-TREE', step)
+
+    def cursor_pages(self, queryset, **cursor_fields):
+        """Запросы следующей и предыдущей страниц от ключа поста."""
+        paginator = CursorPaginator(queryset, POSTS_IN_PAGE, **cursor_fields)
+        ordered = paginator.ordered()
+        date, pk = self.post.pub_date, self.post.pk
+        return (
+            paginator.keyset(ordered, date, pk, forward=True)
+            [:POSTS_IN_PAGE],
+            paginator.keyset(ordered.reverse(), date, pk, forward=False)
+            [:POSTS_IN_PAGE],
+        )
+
+    def test_cursor_queries_use_indexes(self):
+        """Курсорные страницы — диапазон по индексу без сортировки."""
+        feeds = {
+            'index': Post.objects.all(),
+            'group': self.group.posts.all(),
+            'profile': self.user.posts.all(),
+        }
+        for name, queryset in feeds.items():
+            for queryset in self.cursor_pages(queryset):
+                with self.subTest(name=name):
+                    self.assertNoFullScan(queryset)
+        entry_feeds = {
+            'follow': timeline_posts(self.reader),
+            'tag': tag_posts(self.tag),
+            'mentions': mention_posts(self.reader),
+        }
+        for name, queryset in entry_feeds.items():
+            for queryset in self.cursor_pages(
+                queryset, date_field='feed_date', key_field='feed_key',
+            ):
+                with self.subTest(name=name):
+                    self.assertNoFullScan(queryset)
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент, комментариев и подписок идут по индексам."""
+        querysets = {
+            'index': Post.objects.all()[:POSTS_IN_PAGE],
+            'group': self.group.posts.all()[:POSTS_IN_PAGE],
+            'profile': self.user.posts.all()[:POSTS_IN_PAGE],
+            'follow': timeline_posts(self.reader)[:POSTS_IN_PAGE],
+            'tag': tag_posts(self.tag)[:POSTS_IN_PAGE],
+            'mentions': mention_posts(self.reader)[:POSTS_IN_PAGE],
+            'comments': Comment.objects.filter(
+                post=self.post).order_by('created'),
+            'following': Follow.objects.filter(user=self.reader,
+                                               author=self.user),
+        }
+        for name, queryset in querysets.items():
+            with self.subTest(name=name):
+                self.assertNoFullScan(queryset)
+
+    def test_comment_subtree_is_index_range(self):
+        """Поддерево комментария — диапазон по индексу (post, path)."""
+        root = Comment.objects.create(
+            post=self.post, author=self.user, text='Корень'
+        )
+        queryset = subtree_descendants(root)[:SUBTREE_LIMIT]
+        self.assertNoFullScan(queryset)
+        self.assertEqual(query_plan(queryset), [
+            'SEARCH posts_comment USING INDEX comment_post_path_idx '
+            '(post_id=? AND path>? AND path<?)',
+        ])
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='budget_reader')
+        cls.author = User.objects.create_user(username='budget_author')
+        cls.group = Group.objects.create(title='Группа', slug='budget')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse('posts:group_list',
+                                        kwargs={'slug': self.group.slug}),
+            'posts:profile': reverse('posts:profile',
+                                     kwargs={'username': self.author}),
+            'posts:post_detail': reverse('posts:post_detail',
+                                         kwargs={'post_id': self.post.pk}),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def add_rows(self):
+        """Заполняет страницу постами и комментариями разных авторов."""
+        for i in range(POSTS_IN_PAGE):
+            user = User.objects.create_user(username=f'budget_{i}',
+                                            first_name=f'Имя {i}')
+            group = Group.objects.create(title=f'Группа {i}',
+                                         slug=f'budget_{i}')
+            Post.objects.create(text=f'Пост {i}', author=self.author,
+                                group=group)
+            Post.objects.create(text=f'Пост {i}', author=user, group=group)
+            Comment.objects.create(post=self.post, author=user,
+                                   text=f'Комментарий {i}')
+
+    def test_views_fit_query_budget(self):
+        """Число запросов страницы не зависит от числа постов на ней."""
+        self.add_rows()
+        for name, url in self.urls.items():
+            with self.subTest(url=url):
+                self.client.get(url)
+                cache.clear()
+                with self.assertMaxQueries(QUERY_BUDGETS[name]):
+                    self.client.get(url)
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import (Comment, Follow, Group, MediaBlob, Post, PostTag,
+                      TimelineEntry)
+from ..search import SearchResults
+from ..seeding import Seeder
+from ..timeline import timeline_posts
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeederTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, **kwargs):
+        options = {'users': 5, 'groups': 2, 'posts': 30, 'batch_size': 7,
+                   'defer_indexes': False}
+        options.update(kwargs)
+        Seeder(**options).run()
+
+    def test_derived_data_is_consistent(self):
+        self.seed(comments=2, follows=2, images=2)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 60)
+        self.assertFalse(Comment.objects.filter(path='').exists())
+        self.assertEqual(Follow.objects.count(), 10)
+        self.assertEqual(
+            sum(Group.objects.values_list('posts_count', flat=True)),
+            Post.objects.filter(group__isnull=False).count(),
+        )
+        self.assertEqual(
+            sum(MediaBlob.objects.values_list('refs', flat=True)), 30
+        )
+        tagged = [post for post in Post.objects.all() if '#' in post.text]
+        self.assertEqual(PostTag.objects.count(), len(tagged))
+        word = Post.objects.first().text.split()[0]
+        self.assertGreater(SearchResults(word).count(), 0)
+
+        follow = Follow.objects.first()
+        self.assertEqual(
+            list(timeline_posts(follow.user).values_list('pk', flat=True)),
+            list(Post.objects.filter(
+                author__following__user=follow.user
+            ).values_list('pk', flat=True)),
+        )
+        self.assertTrue(TimelineEntry.objects.exists())
+
+        post = Post.objects.create(text='Обычный пост', author=follow.user)
+        self.assertEqual(post.pk, 31)
+        self.assertGreater(post.pub_date, Post.objects.last().pub_date)
+
+    def test_same_seed_same_data(self):
+        self.seed(seed=7)
+        first = list(Post.objects.values_list('text', flat=True))
+        Post.objects.all().delete()
+        self.seed(seed=7)
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), first
+        )
+
+    def test_command(self):
+        call_command('seed_yatube', users=3, groups=1, posts=10, follows=1,
+                     keep_indexes=True, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Post.objects.count(), 10)
+        self.assertEqual(Follow.objects.count(), 3)
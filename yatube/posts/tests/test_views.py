@@ -1,16 +1,29 @@
+import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
-from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.template.loader import render_to_string
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Group, Post, Follow
+from posts.models import (AuthorStats, Comment, Group, Mention, Post,
+                          Follow, PostTag, Tag, TimelineEntry)
+from posts.caching import version_key
+from posts.paginators import (CURSOR_FROM_PAGE, FeedPaginator,
+                              feed_count_key)
+from posts.timeline import timeline_count_key
+from posts.search import get_backend
+from posts.comments import REPLIES_IN_THREAD, comment_threads
+from posts.models import COMMENT_MAX_DEPTH
+from posts.views import COMMENTS_IN_PAGE, POSTS_IN_PAGE
 
 User = get_user_model()
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 TEST_OF_POST: int = 13
 
@@ -26,6 +39,11 @@ class PostPagesTests(TestCase):
         cls.follower = Follow.objects.create(
             user=cls.follow_user, author=cls.user)
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         cache.clear()
         self.guest_client = Client()
@@ -166,6 +184,21 @@ class PostPagesTests(TestCase):
         response = self.authorized_client.get(f'/posts/{self.post.id}/')
         self.assertContains(response, comments['text'])
 
+    def test_comment_keeps_post_fragments(self):
+        """Комментарий сбрасывает только фрагмент комментариев поста."""
+        post_key = version_key('post', self.post.pk)
+        comments_key = version_key('post_comments', self.post.pk)
+        self.authorized_client.get(f'/posts/{self.post.id}/')
+        versions = cache.get_many([post_key, comments_key])
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Новый комментарий'},
+        )
+        self.assertEqual(cache.get(post_key), versions[post_key])
+        self.assertNotEqual(cache.get(comments_key), versions[comments_key])
+        response = self.authorized_client.get(f'/posts/{self.post.id}/')
+        self.assertContains(response, 'Новый комментарий')
+
     def test_anonym_cannot_add_comments(self):
         """НЕ Авторизированный пользователь не может оставить коментарий"""
         comments = {'text': 'комент не пройдет'}
@@ -180,10 +213,8 @@ class PostPagesTests(TestCase):
         """Проверка хранения и очищения кэша для index."""
         response = self.authorized_client.get(reverse('posts:index'))
         posts = response.content
-        Post.objects.create(
-            text='новейший пост',
-            author=self.post.author,
-        )
+        # update() не шлёт сигналов: страница остаётся в кэше.
+        Post.objects.filter(pk=self.post.pk).update(text='тихая правка')
         response_old = self.authorized_client.get(reverse('posts:index'))
         old_posts = response_old.content
         self.assertEqual(old_posts, posts)
@@ -191,6 +222,15 @@ class PostPagesTests(TestCase):
         response_new = self.authorized_client.get(reverse('posts:index'))
         new_posts = response_new.content
         self.assertNotEqual(old_posts, new_posts)
+        # Сохранение поста любым способом сбрасывает страницу сразу.
+        Post.objects.create(
+            text='новейший пост',
+            author=self.post.author,
+        )
+        self.assertContains(
+            self.authorized_client.get(reverse('posts:index')),
+            'новейший пост',
+        )
 
     def test_follow_index_show_cont(self):
         """Шаблон follow сформирован с правильным контекстом."""
@@ -229,3 +269,738 @@ class PostPagesTests(TestCase):
         response = self.follower_client.get(reverse('posts:follow_index'))
         self.assertTrue(count_post_follower)
         self.assertFalse(len(response.context['page_obj']))
+
+
+class PaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='paginator')
+        cls.group = Group.objects.create(title='Группа пагинатора',
+                                         slug='paginator_group')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(TEST_OF_POST)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+
+    def test_second_page_contains_rest_posts(self):
+        """Вторая страница ленты содержит оставшиеся посты."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, {'page': 2})
+                self.assertEqual(len(response.context['page_obj']),
+                                 TEST_OF_POST - POSTS_IN_PAGE)
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """Курсорная пагинация проходит ленту без пропусков и повторов."""
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, {'cursor': ''})
+                first_page = response.context['page_obj']
+                self.assertFalse(first_page.has_previous())
+                response = self.client.get(
+                    url, {'cursor': first_page.next_cursor})
+                second_page = response.context['page_obj']
+                self.assertFalse(second_page.has_next())
+                self.assertEqual(list(first_page) + list(second_page),
+                                 expected)
+                response = self.client.get(
+                    url, {'cursor': second_page.previous_cursor})
+                self.assertEqual(list(response.context['page_obj']),
+                                 list(first_page))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Некорректный курсор отдаёт первую страницу."""
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': 'broken'})
+        self.assertEqual(len(response.context['page_obj']), POSTS_IN_PAGE)
+
+    def test_page_window_is_bounded(self):
+        """Навигация выводит только соседние страницы, а не все."""
+        page_obj = FeedPaginator(range(100), POSTS_IN_PAGE).get_page(8)
+        self.assertEqual(list(page_obj.page_window), [6, 7, 8, 9, 10])
+        Post.objects.bulk_create(
+            Post(text=f'Ещё пост {i}', author=self.user)
+            for i in range(POSTS_IN_PAGE * 10)
+        )
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj.page_window), [1, 2, 3, 4])
+        self.assertContains(response, '?page=1"')
+        self.assertNotContains(response, '?page=6"')
+
+    def test_deep_pages_are_not_linked_by_number(self):
+        """Окно номеров и «Последняя» не ведут глубже CURSOR_FROM_PAGE."""
+        Post.objects.bulk_create(
+            Post(text=f'Ещё пост {i}', author=self.user)
+            for i in range(POSTS_IN_PAGE * 10)
+        )
+        response = self.client.get(reverse('posts:index'),
+                                   {'page': CURSOR_FROM_PAGE - 1})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.page_window.stop - 1, CURSOR_FROM_PAGE)
+        self.assertNotContains(response, f'?page={CURSOR_FROM_PAGE + 1}"')
+        self.assertNotContains(
+            response, f'?page={page_obj.paginator.num_pages}"')
+        self.assertNotContains(response, 'Последняя')
+
+    def test_deep_pages_link_to_cursors(self):
+        """С CURSOR_FROM_PAGE страница без COUNT ссылается на курсоры."""
+        Post.objects.bulk_create(
+            Post(text=f'Ещё пост {i}', author=self.user)
+            for i in range(POSTS_IN_PAGE * 10)
+        )
+        cache.clear()
+        url = reverse('posts:index')
+        shallow = self.client.get(url, {'page': CURSOR_FROM_PAGE - 1})
+        self.assertIsNone(getattr(shallow.context['page_obj'],
+                                  'next_cursor', None))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page': CURSOR_FROM_PAGE})
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, CURSOR_FROM_PAGE)
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}"')
+        self.assertContains(response, f'?cursor={page_obj.previous_cursor}"')
+        self.assertNotContains(response, 'Последняя')
+        next_page = self.client.get(url, {'cursor': page_obj.next_cursor})
+        self.assertEqual(
+            list(next_page.context['page_obj']),
+            list(self.client.get(url, {'page': CURSOR_FROM_PAGE + 1})
+                 .context['page_obj']),
+        )
+
+    def test_cached_cursor_page_is_not_queried(self):
+        """При попадании в кэш фрагмента курсорная страница не читается."""
+        url = reverse('posts:index')
+        first = self.client.get(url, {'cursor': ''}).context['page_obj']
+        token = first.next_cursor
+        self.client.get(url, {'cursor': token})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'cursor': token})
+        self.assertFalse(any('"posts_post"' in query['sql']
+                             for query in queries.captured_queries))
+        self.assertContains(response, '?cursor="')
+
+    def test_feed_count_is_cached(self):
+        """Число постов ленты кэшируется и сбрасывается при создании поста."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        key = feed_count_key('group', self.group.pk)
+        self.client.get(url)
+        self.assertEqual(cache.get(key), TEST_OF_POST)
+        post = Post.objects.create(text='Новый пост', author=self.user,
+                                   group=self.group)
+        self.assertIsNone(cache.get(key))
+        self.client.get(url)
+        self.assertEqual(cache.get(key), TEST_OF_POST + 1)
+        post.group = None
+        post.save()
+        self.assertIsNone(cache.get(key))
+        self.client.get(url)
+        post.delete()
+        self.assertIsNone(cache.get(feed_count_key('index')))
+        self.assertEqual(cache.get(key), TEST_OF_POST)
+
+
+class FollowTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='timeline_author')
+        cls.reader = User.objects.create_user(username='timeline_reader')
+        cls.old_post = Post.objects.create(author=cls.author,
+                                           text='Пост до подписки')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def get_feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_timeline_follows_subscriptions(self):
+        """Лента подписок заполняется при подписке и публикации."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.get_feed(), [self.old_post])
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.get_feed(), [])
+
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты автора с огромной аудиторией дописываются при чтении."""
+        other = User.objects.create_user(username='timeline_other')
+        Follow.objects.create(user=self.reader, author=other)
+        other_post = Post.objects.create(author=other, text='Обычный')
+        with mock.patch('posts.timeline.FANOUT_MAX_FOLLOWERS', 1):
+            AuthorStats.for_user(self.author)
+            Follow.objects.create(user=self.reader, author=self.author)
+            Follow.objects.create(user=other, author=self.author)
+            new_post = Post.objects.create(author=self.author, text='Новый')
+            self.assertFalse(TimelineEntry.objects.filter(
+                user=self.reader, post=new_post))
+            self.assertEqual(self.get_feed(),
+                             [new_post, other_post, self.old_post])
+            self.assertTrue(TimelineEntry.objects.filter(
+                user=self.reader, post=new_post))
+            newest = Post.objects.create(author=self.author, text='Ещё')
+            self.assertEqual(self.get_feed()[0], newest)
+
+    def test_celebrity_without_stats_row(self):
+        """Автор без строки счётчиков определяется по числу подписчиков."""
+        other = User.objects.create_user(username='timeline_other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        AuthorStats.objects.filter(user=self.author).delete()
+        with mock.patch('posts.timeline.FANOUT_MAX_FOLLOWERS', 1):
+            new_post = Post.objects.create(author=self.author, text='Новый')
+            self.assertFalse(TimelineEntry.objects.filter(post=new_post))
+            self.assertEqual(self.get_feed()[0], new_post)
+
+    def test_timeline_count_is_cached(self):
+        """Длина ленты кэшируется и сбрасывается раскладкой поста."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        key = timeline_count_key(self.reader.pk)
+        self.get_feed()
+        self.assertEqual(cache.get(key), 1)
+        post = Post.objects.create(author=self.author, text='Новый')
+        self.assertIsNone(cache.get(key))
+        self.get_feed()
+        self.assertEqual(cache.get(key), 2)
+        post.delete()
+        self.assertIsNone(cache.get(key))
+
+    @mock.patch('posts.timeline.TIMELINE_TRIM_SLACK', 1)
+    @mock.patch('posts.timeline.TIMELINE_LENGTH', 2)
+    def test_timeline_is_trimmed(self):
+        """Лента хранит только TIMELINE_LENGTH последних постов."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(2)
+        ]
+        self.assertEqual(len(self.get_feed()), 3)
+        posts.append(
+            Post.objects.create(author=self.author, text='Последний')
+        )
+        self.assertEqual(self.get_feed(), posts[:-3:-1])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+
+    def test_cursor_pages_walk_timeline(self):
+        """Курсор ленты подписок проходит её без пропусков и повторов."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}')
+            for i in range(POSTS_IN_PAGE)
+        )
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user=self.reader, post=post, author=self.author,
+                          pub_date=post.pub_date)
+            for post in Post.objects.exclude(pk=self.old_post.pk)
+        )
+        url = reverse('posts:follow_index')
+        first = self.client.get(url, {'cursor': ''}).context['page_obj']
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            list(first) + list(second),
+            list(Post.objects.order_by('-pub_date', '-pk')),
+        )
+
+
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cache_author')
+        cls.group = Group.objects.create(title='Кэш', slug='cache_group')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(TEST_OF_POST)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_pages_are_cached_separately(self):
+        """Каждая страница ленты кэшируется под своим ключом."""
+        first = self.client.get(reverse('posts:index'))
+        second = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertNotEqual(first.content, second.content)
+
+    def test_view_writes_invalidate_pages(self):
+        """Создание и правка поста через сайт сбрасывают кэш страниц."""
+        index_url = reverse('posts:index')
+        group_url = reverse('posts:group_list',
+                            kwargs={'slug': self.group.slug})
+        self.client.get(index_url)
+        self.client.get(group_url)
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Свежий пост', 'group': self.group.pk})
+        self.assertContains(self.client.get(index_url), 'Свежий пост')
+        self.assertContains(self.client.get(group_url), 'Свежий пост')
+
+        post = Post.objects.get(text='Свежий пост')
+        detail_url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        self.client.get(detail_url)
+        self.client.post(reverse('posts:post_edit',
+                                 kwargs={'post_id': post.pk}),
+                         {'text': 'Исправленный пост'})
+        self.assertNotContains(self.client.get(group_url), 'Свежий пост')
+        self.assertContains(self.client.get(detail_url), 'Исправленный пост')
+        self.client.post(reverse('posts:add_comment',
+                                 kwargs={'post_id': post.pk}),
+                         {'text': 'Новый комментарий'})
+        self.assertContains(self.client.get(detail_url), 'Новый комментарий')
+
+    def test_user_changes_invalidate_pages(self):
+        """Переименование и удаление автора сбрасывают кэш страниц."""
+        writer = User.objects.create_user(username='cache_writer',
+                                          first_name='Старое')
+        Post.objects.create(text='Пост автора', author=writer,
+                            group=self.group)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+        )
+        for url in urls:
+            self.assertContains(self.client.get(url), 'Старое')
+        writer.first_name = 'Новое'
+        writer.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Новое')
+                self.assertNotContains(response, 'Старое')
+        writer.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'Пост автора')
+
+    def test_login_keeps_pages(self):
+        """Вход пользователя не сбрасывает кэш страниц."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        with mock.patch('posts.signals.bump_version') as bump:
+            self.user.save(update_fields=['last_login'])
+        bump.assert_not_called()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='searcher')
+        cls.in_text = Post.objects.create(
+            text='Кошки и собаки', author=cls.user
+        )
+        cls.in_comment = Post.objects.create(
+            text='Про погоду', author=cls.user
+        )
+        Comment.objects.create(
+            post=cls.in_comment, author=cls.user, text='А у меня кошки'
+        )
+        Post.objects.create(text='Ничего общего', author=cls.user)
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return list(response.context['page_obj'])
+
+    def test_posts_ranked_above_comments(self):
+        self.assertEqual(
+            self.search('КОШКИ'), [self.in_text, self.in_comment]
+        )
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('кошки собаки'), [self.in_text])
+        self.assertEqual(self.search('кошки "погоду'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(pk=self.in_text.pk)
+        post.text = 'Только собаки'
+        post.save()
+        self.assertEqual(self.search('кошки'), [self.in_comment])
+        self.in_comment.comments.all().delete()
+        self.assertEqual(self.search('кошки'), [])
+        post.delete()
+        self.assertEqual(self.search('собаки'), [])
+
+    def test_results_are_paginated(self):
+        Post.objects.bulk_create([
+            Post(text=f'Поиск {i}', author=self.user) for i in range(12)
+        ])
+        get_backend().rebuild()
+        response = self.client.get(reverse('posts:search'), {'q': 'поиск'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        self.assertEqual(len(response.context['page_obj']), POSTS_IN_PAGE)
+        self.assertContains(
+            response, '?q=%D0%BF%D0%BE%D0%B8%D1%81%D0%BA&amp;page=2'
+        )
+        self.assertEqual(len(self.search('поиск', page=2)), 2)
+
+    @override_settings(POSTS_SEARCH_BACKEND='posts.search.LikeBackend')
+    def test_like_backend(self):
+        self.assertEqual(self.search('собаки'), [self.in_text])
+        self.assertEqual(self.search('меня кошки'), [self.in_comment])
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        cases = (
+            (None, 'кошки', {self.in_text, self.in_comment}),
+            ('posts.search.LikeBackend', 'собаки', {self.in_text}),
+        )
+        for backend, query, found in cases:
+            with self.subTest(backend=backend), \
+                    self.settings(POSTS_SEARCH_BACKEND=backend), \
+                    CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    reverse('admin:posts_post_changelist'), {'q': query}
+                )
+                self.assertEqual(
+                    set(response.context['cl'].result_list), found
+                )
+            # Найденные pk не подставляются в запрос списком.
+            for query in queries.captured_queries:
+                self.assertNotIn(f'IN ({self.in_text.pk}', query['sql'])
+
+
+class TagFeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='tagger')
+        cls.friend = User.objects.create_user(username='friend')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def create_post(self, text):
+        self.client.post(reverse('posts:post_create'), {'text': text})
+        return Post.objects.latest('pk')
+
+    def feed(self, url, **params):
+        return list(self.client.get(url, params).context['page_obj'])
+
+    def test_tags_and_mentions_are_extracted(self):
+        post = self.create_post(
+            'Привет, @friend. #Django и #django, #кот; @nobody a#b'
+        )
+        self.assertEqual(
+            set(Tag.objects.values_list('name', flat=True)),
+            {'django', 'кот'},
+        )
+        self.assertEqual(post.post_tags.count(), 2)
+        self.assertEqual(
+            list(Mention.objects.values_list('user', flat=True)),
+            [self.friend.pk],
+        )
+        self.assertEqual(
+            self.feed(reverse('posts:tag_list', args=['Django'])), [post]
+        )
+        self.assertEqual(
+            self.feed(reverse('posts:mentions', args=['friend'])), [post]
+        )
+
+    def test_too_long_tag_is_ignored(self):
+        """Слово длиннее 50 символов не превращается в обрезанный тег."""
+        self.create_post(f'#{"a" * 51} #{"b" * 50}')
+        self.assertEqual(list(Tag.objects.values_list('name', flat=True)),
+                         ['b' * 50])
+
+    def test_edit_updates_tags_and_feed_counts(self):
+        post = self.create_post('#старый @friend')
+        url = reverse('posts:tag_list', args=['старый'])
+        self.assertEqual(self.feed(url), [post])
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]), {'text': '#новый'}
+        )
+        self.assertEqual(self.feed(url), [])
+        self.assertEqual(
+            self.feed(reverse('posts:tag_list', args=['новый'])), [post]
+        )
+        self.assertFalse(Mention.objects.exists())
+        post.delete()
+        self.assertFalse(PostTag.objects.exists())
+
+    def test_tag_feed_pages(self):
+        posts = [self.create_post(f'#лента @friend {i}') for i in range(12)]
+        posts.reverse()
+        urls = (
+            reverse('posts:tag_list', args=['лента']),
+            reverse('posts:mentions', args=['friend']),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.feed(url), posts[:POSTS_IN_PAGE])
+                self.assertEqual(
+                    self.feed(url, page=2), posts[POSTS_IN_PAGE:]
+                )
+                page = self.client.get(url).context['page_obj']
+                self.assertEqual(page.paginator.count, 12)
+                first = self.client.get(
+                    url, {'cursor': ''}
+                ).context['page_obj']
+                self.assertEqual(list(first), posts[:POSTS_IN_PAGE])
+                second = self.client.get(
+                    url, {'cursor': first.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(second), posts[POSTS_IN_PAGE:])
+                self.assertEqual(
+                    self.feed(url, cursor=second.previous_cursor),
+                    posts[:POSTS_IN_PAGE],
+                )
+
+    def test_entry_cursor_breaks_date_ties(self):
+        """Посты с одной датой не теряются на границе курсорных страниц."""
+        posts = [self.create_post(f'#ровно {i}') for i in range(12)]
+        date = posts[0].pub_date
+        Post.objects.update(pub_date=date)
+        PostTag.objects.update(pub_date=date)
+        url = reverse('posts:tag_list', args=['ровно'])
+        first = self.client.get(url, {'cursor': ''}).context['page_obj']
+        walked = list(first) + self.feed(url, cursor=first.next_cursor)
+        self.assertEqual(walked, sorted(posts, key=lambda post: -post.pk))
+
+
+class ArticleFragmentTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(title='Классика', slug='classic')
+        cls.post = Post.objects.create(
+            text='#роман Война и мир', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:tag_list', args=['роман'])
+
+    def render_count(self):
+        with mock.patch('posts.fragments.render_to_string',
+                        wraps=render_to_string) as render:
+            response = self.client.get(self.url)
+        return render.call_count, response
+
+    def test_cards_are_rendered_once(self):
+        self.assertEqual(self.render_count()[0], 1)
+        self.assertEqual(self.render_count()[0], 0)
+
+    def test_cards_follow_post_group_and_author_changes(self):
+        self.render_count()
+        self.client.force_login(self.author)
+        self.client.post(reverse('posts:post_edit', args=[self.post.pk]), {
+            'text': '#роман Анна Каренина', 'group': self.group.pk,
+        })
+        count, response = self.render_count()
+        self.assertEqual(count, 1)
+        self.assertContains(response, 'Анна Каренина')
+
+        admin = User.objects.create_superuser('admin', 'a@example.com', 'pw')
+        self.client.force_login(admin)
+        self.client.post(
+            reverse('admin:posts_group_change', args=[self.group.pk]),
+            {'title': 'Проза', 'slug': 'classic', 'description': 'Книги'},
+        )
+        self.assertContains(self.render_count()[1], 'Проза')
+
+    def test_author_rename_reaches_cached_pages(self):
+        """Новое имя автора видно и на лентах с кэшем всей страницы."""
+        urls = (
+            self.url,
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+        )
+        for url in urls:
+            self.assertContains(self.client.get(url), 'Лев Толстой')
+
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Николаевич'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.client.get(url), 'Николаевич Толстой'
+                )
+        self.client.force_login(author)
+        self.assertEqual(self.render_count()[0], 0)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(text='Популярный пост', author=cls.user)
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(COMMENTS_IN_PAGE + 5)
+        ])
+        cls.texts = [f'Комментарий {i}' for i in range(COMMENTS_IN_PAGE + 5)]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_page_shows_first_comments(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        page = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in page],
+            self.texts[:COMMENTS_IN_PAGE],
+        )
+        self.assertContains(response, 'data-more-comments')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]),
+            {'comments': page.next_cursor},
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            self.texts[COMMENTS_IN_PAGE:],
+        )
+
+    def test_load_more_returns_partial_and_json(self):
+        first = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        ).context['comments']
+        url = reverse('posts:comments', args=[self.post.pk])
+        response = self.client.get(url, {'cursor': first.next_cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertNotContains(response, '<html')
+        self.assertNotContains(response, 'data-more-comments')
+        self.assertContains(response, self.texts[-1])
+
+        data = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            self.texts[:COMMENTS_IN_PAGE],
+        )
+        data = self.client.get(
+            url, {'format': 'json', 'cursor': data['next_cursor']}
+        ).json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertIsNone(data['next_cursor'])
+
+
+class CommentThreadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='replier')
+        cls.post = Post.objects.create(text='Обсуждение', author=cls.user)
+        cls.other_post = Post.objects.create(text='Другой', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def reply(self, text, parent=None, post=None):
+        post = post or self.post
+        self.client.post(
+            reverse('posts:add_comment', args=[post.pk]),
+            {'text': text, 'parent': parent.pk if parent else ''},
+        )
+        return Comment.objects.latest('pk')
+
+    def test_replies_get_path_and_thread(self):
+        root = self.reply('Корень')
+        child = self.reply('Ответ', root)
+        grandchild = self.reply('Ответ на ответ', child)
+        self.assertEqual(root.depth, 0)
+        self.assertIsNone(root.thread_id)
+        self.assertEqual(grandchild.depth, 2)
+        self.assertEqual(grandchild.thread_id, root.pk)
+        self.assertEqual(grandchild.position, 2)
+        self.assertTrue(grandchild.path.startswith(child.path))
+        self.assertTrue(child.path.startswith(root.path))
+
+    def test_reply_is_attached_atomically(self):
+        """Ответ без пути и номера в ветке не остаётся в базе."""
+        root = self.reply('Корень')
+        with mock.patch.object(Comment.objects, 'select_for_update',
+                               side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                Comment.objects.create(post=self.post, author=self.user,
+                                       text='Ответ', parent=root)
+        self.assertEqual(Comment.objects.count(), 1)
+        root.refresh_from_db()
+        self.assertEqual(root.last_position, 0)
+
+    def test_cannot_reply_to_other_posts_comment(self):
+        foreign = self.reply('Чужой', post=self.other_post)
+        count = Comment.objects.count()
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Ответ', 'parent': foreign.pk},
+        )
+        self.assertRedirects(
+            response, reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertEqual(Comment.objects.count(), count)
+
+    def test_depth_is_capped(self):
+        comment = self.reply('0')
+        for i in range(COMMENT_MAX_DEPTH + 2):
+            comment = self.reply(str(i + 1), comment)
+        self.assertEqual(comment.depth, COMMENT_MAX_DEPTH)
+
+    def test_threads_page_is_one_query(self):
+        roots = [self.reply(f'Ветка {i}') for i in range(3)]
+        first = self.reply('Ответ 0', roots[0])
+        self.reply('Вложенный', first)
+        for i in range(1, REPLIES_IN_THREAD + 1):
+            self.reply(f'Ответ {i}', roots[0])
+        with self.assertNumQueries(1):
+            page = comment_threads(self.post, None, 2)
+            threads = [
+                (root, [reply.text for reply in root.shown_replies])
+                for root in page
+            ]
+        self.assertEqual([root for root, _ in threads], roots[:2])
+        self.assertEqual(
+            threads[0][1], ['Ответ 0', 'Вложенный', 'Ответ 1']
+        )
+        self.assertTrue(threads[0][0].more_replies)
+        self.assertTrue(page.has_next())
+        next_page = comment_threads(self.post, page.next_cursor, 2)
+        self.assertEqual(list(next_page), roots[2:])
+
+    def test_thread_endpoint_returns_subtree(self):
+        root = self.reply('Корень')
+        child = self.reply('Ответ', root)
+        self.reply('Соседняя ветка')
+        self.reply('Глубже', child)
+        url = reverse('posts:comment_thread', args=[self.post.pk, root.pk])
+        data = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Корень', 'Ответ', 'Глубже'],
+        )
+        response = self.client.get(url)
+        self.assertTemplateUsed(
+            response, 'posts/includes/comment_thread.html'
+        )
@@ -0,0 +1,164 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Шаблоны не вызывают sorl при рендере: миниатюра строится в пуле потоков
+после сохранения поста, её адрес кладётся в кэш, а до этого страница
+показывает заглушку. Когда миниатюра готова, фрагменты лент с постом
+сбрасываются, чтобы заглушка не осталась в кэше.
+"""
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection, connections, transaction
+from PIL import Image, ImageOps
+from sorl.thumbnail import get_thumbnail
+
+from core.metrics import thumbnail_seconds
+from core.profiling import span
+
+from .caching import bump_post_feeds
+from .models import Post
+
+THUMBNAIL_GEOMETRY: str = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+PENDING_TIMEOUT: int = 60
+VARIANT_WIDTHS = (320, 640, 960)
+VARIANT_QUALITY: int = 80
+# Порядок важен: браузер берёт первый поддерживаемый <source>.
+VARIANT_FORMATS = (
+    ('AVIF', 'avif', 'image/avif'),
+    ('WEBP', 'webp', 'image/webp'),
+    ('JPEG', 'jpg', 'image/jpeg'),
+)
+
+logger = logging.getLogger(__name__)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def thumbnail_key(image_name):
+    return f'thumbnail:{THUMBNAIL_GEOMETRY}:{image_name}'
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def variant_formats():
+    """Форматы, которые умеет сохранять установленный Pillow."""
+    Image.init()
+    return [fmt for fmt in VARIANT_FORMATS if fmt[0] in Image.SAVE]
+
+
+def build_variants(post):
+    """Сохраняет кадрированные копии картинки нескольких ширин.
+
+    Возвращает описание вариантов для Post.image_variants: имя файла в
+    хранилище, ширину и MIME-тип.
+    """
+    width, height = (int(size) for size in THUMBNAIL_GEOMETRY.split('x'))
+    storage = post.image.storage
+    stem = os.path.splitext(os.path.basename(post.image.name))[0]
+    with storage.open(post.image.name) as source:
+        image = Image.open(source)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    variants = []
+    for variant_width in VARIANT_WIDTHS:
+        size = (variant_width, round(height * variant_width / width))
+        resized = ImageOps.fit(image, size, Image.LANCZOS)
+        for fmt, extension, mime in variant_formats():
+            frame = resized.convert('RGB') if fmt == 'JPEG' else resized
+            content = io.BytesIO()
+            frame.save(content, fmt, quality=VARIANT_QUALITY)
+            name = storage.save(
+                f'posts/variants/{stem}-{variant_width}.{extension}',
+                ContentFile(content.getvalue()),
+            )
+            variants.append(
+                {'name': name, 'width': variant_width, 'type': mime}
+            )
+    return variants
+
+
+def generate_thumbnail(post):
+    """Строит миниатюру и варианты картинки, сохраняет их адреса."""
+    try:
+        start = time.perf_counter()
+        with span('thumbnail'):
+            thumbnail = get_thumbnail(
+                post.image.name, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS
+            )
+            post.image_variants = json.dumps(build_variants(post))
+        thumbnail_seconds.observe(time.perf_counter() - start)
+        Post.objects.filter(pk=post.pk, image=post.image.name).update(
+            image_variants=post.image_variants
+        )
+        cache.set(thumbnail_key(post.image.name), thumbnail.url, None)
+        bump_post_feeds(post)
+    except Exception:
+        logger.exception('Не удалось построить миниатюру %s', post.image)
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+def use_workers():
+    # Общую базу SQLite в памяти (тесты) поток пула блокирует на уровне
+    # таблиц, и очистка базы после теста падает с «table is locked».
+    in_memory = (connection.vendor == 'sqlite'
+                 and connection.is_in_memory_db())
+    return settings.THUMBNAIL_WORKERS and not in_memory
+
+
+def enqueue_thumbnail(post):
+    """Ставит построение миниатюры в очередь после коммита транзакции."""
+    if not post.image:
+        return
+    if not cache.add(f'{thumbnail_key(post.image.name)}:pending', True,
+                     PENDING_TIMEOUT):
+        return
+    if use_workers():
+        transaction.on_commit(
+            lambda: get_executor().submit(generate_thumbnail, post)
+        )
+    else:
+        transaction.on_commit(lambda: generate_thumbnail(post))
+
+
+def preload_thumbnails(posts):
+    """Читает адреса миниатюр всей страницы одним запросом к кэшу.
+
+    Адрес сохраняется в атрибуте ``thumbnail_url`` поста, и
+    ready_thumbnail_url больше не обращается к кэшу для каждого поста.
+    """
+    posts = [post for post in posts if not hasattr(post, 'thumbnail_url')]
+    keys = [thumbnail_key(post.image.name) for post in posts if post.image]
+    urls = cache.get_many(keys) if keys else {}
+    for post in posts:
+        post.thumbnail_url = None
+        if post.image:
+            post.thumbnail_url = urls.get(thumbnail_key(post.image.name))
+            if post.thumbnail_url is None:
+                enqueue_thumbnail(post)
+
+
+def ready_thumbnail_url(post):
+    """Адрес готовой миниатюры или None; отсутствующая ставится в очередь."""
+    preload_thumbnails([post])
+    return post.thumbnail_url
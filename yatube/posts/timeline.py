@@ -0,0 +1,166 @@
+"""Лента подписок, материализованная при записи (fan-out on write).
+
+При публикации пост раскладывается в TimelineEntry каждого подписчика,
+поэтому чтение ленты — диапазон по индексу (user, -pub_date, -post).
+Посты авторов с очень большим числом подписчиков не раскладываются при
+записи: читатель сам дописывает их в свою ленту перед чтением (fan-out
+on read), так что лента всегда читается из одной таблицы.
+
+Длина ленты кэшируется под ключом счётчика для пагинатора, а ключ
+сбрасывается при каждом изменении её строк. Пересчитывая длину при
+чтении, лента обрезается до TIMELINE_LENGTH последних постов, если
+выросла больше чем на TIMELINE_TRIM_SLACK строк сверх него.
+"""
+from itertools import islice
+
+from django.core.cache import cache
+from django.db.models import F, Max, Q
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginators import FEED_COUNT_TIMEOUT, feed_count_key
+
+FANOUT_MAX_FOLLOWERS: int = 10000
+TIMELINE_BACKFILL: int = 100
+TIMELINE_LENGTH: int = 1000
+TIMELINE_TRIM_SLACK: int = 100
+FANOUT_BATCH_SIZE: int = 1000
+
+
+def timeline_count_key(user_id):
+    return feed_count_key('timeline', user_id)
+
+
+def timeline_count_keys(post):
+    """Ключи счётчиков лент, в которые разложен пост."""
+    user_ids = TimelineEntry.objects.filter(post=post).values_list(
+        'user_id', flat=True
+    )
+    return [timeline_count_key(user_id) for user_id in user_ids]
+
+
+def is_celebrity(author_id):
+    # for_user заводит недостающую строку счётчиков: по ней же
+    # refresh_timeline находит авторов, чьи посты дописываются при чтении.
+    stats = AuthorStats.for_user(author_id)
+    return stats.followers_count > FANOUT_MAX_FOLLOWERS
+
+
+def add_entries(user_id, author_id, posts):
+    """Добавляет посты (pk, pub_date) автора в ленту пользователя."""
+    entries = [
+        TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id,
+                      pub_date=pub_date)
+        for pk, pub_date in posts
+    ]
+    if entries:
+        TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+        cache.delete(timeline_count_key(user_id))
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).iterator()
+    while True:
+        user_ids = list(islice(follower_ids, FANOUT_BATCH_SIZE))
+        if not user_ids:
+            return
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=user_id, post=post,
+                              author_id=post.author_id,
+                              pub_date=post.pub_date)
+                for user_id in user_ids
+            ],
+            ignore_conflicts=True,
+        )
+        cache.delete_many([timeline_count_key(pk) for pk in user_ids])
+
+
+def backfill_timeline(follow):
+    """Переносит последние посты автора в ленту нового подписчика."""
+    if is_celebrity(follow.author_id):
+        return
+    posts = Post.objects.filter(author_id=follow.author_id).values_list(
+        'pk', 'pub_date'
+    )[:TIMELINE_BACKFILL]
+    add_entries(follow.user_id, follow.author_id, posts)
+
+
+def trim_timeline(follow):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id
+    ).delete()
+    cache.delete(timeline_count_key(follow.user_id))
+
+
+def oldest_kept(user_id):
+    """Ключ (pub_date, post_id) последней остающейся строки ленты."""
+    rows = TimelineEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-post_id'
+    ).values_list('pub_date', 'post_id')
+    rows = rows[TIMELINE_LENGTH - 1:TIMELINE_LENGTH]
+    return rows[0] if rows else None
+
+
+def trim_timeline_tail(user_id):
+    """Оставляет в ленте пользователя TIMELINE_LENGTH последних постов."""
+    oldest = oldest_kept(user_id)
+    if oldest is None:
+        return
+    date, post_id = oldest
+    TimelineEntry.objects.filter(
+        Q(pub_date__lt=date) | Q(pub_date=date, post_id__lt=post_id),
+        user_id=user_id, pub_date__lte=date,
+    ).delete()
+
+
+def pull_celebrity_posts(user_id):
+    """Дописывает в ленту новые посты авторов без раскладки при записи."""
+    celebrity_ids = Follow.objects.filter(
+        user_id=user_id,
+        author__stats__followers_count__gt=FANOUT_MAX_FOLLOWERS,
+    ).values_list('author_id', flat=True)
+    for author_id in celebrity_ids:
+        posts = Post.objects.filter(author_id=author_id)
+        latest = TimelineEntry.objects.filter(
+            user_id=user_id, author_id=author_id
+        ).aggregate(latest=Max('pub_date'))['latest']
+        if latest is None:
+            # Посты старше обрезанного хвоста ленты не возвращаем.
+            oldest = oldest_kept(user_id)
+            latest = oldest and oldest[0]
+        if latest is not None:
+            posts = posts.filter(pub_date__gt=latest)
+        add_entries(user_id, author_id, posts.values_list(
+            'pk', 'pub_date'
+        )[:TIMELINE_BACKFILL])
+
+
+def refresh_timeline(user_id):
+    """Подготавливает ленту к чтению: посты знаменитостей, длина, обрезка."""
+    pull_celebrity_posts(user_id)
+    key = timeline_count_key(user_id)
+    if cache.get(key) is not None:
+        return
+    count = TimelineEntry.objects.filter(user_id=user_id).count()
+    if count > TIMELINE_LENGTH + TIMELINE_TRIM_SLACK:
+        trim_timeline_tail(user_id)
+        count = TIMELINE_LENGTH
+    cache.set(key, count, FEED_COUNT_TIMEOUT)
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя.
+
+    Ключ курсора — дата и пост строки ленты (feed_date, feed_key):
+    по ним упорядочен индекс, и выборка идёт без сортировки.
+    """
+    return Post.objects.filter(timeline_entries__user=user).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_key=F('timeline_entries__post_id'),
+    ).order_by('-feed_date', '-feed_key')
@@ -0,0 +1,254 @@
+"""Потоковый приём картинок постов.
+
+Загрузка пишется сразу во временный файл, а решение о приёме
+принимается по первым байтам: размер файла ограничен, размеры картинки
+читаются из заголовка без декодирования, поэтому «бомба» из сжатого
+огромного изображения отклоняется до того, как её прочитает Pillow.
+Остаток отклонённого файла пропускается без записи на диск, а разбор
+запроса продолжается, так что поля после файла не теряются; причина
+отказа попадает в форму через RejectedUpload. EXIF (APP1 в JPEG, eXIf
+в PNG) вырезается на лету.
+
+Обработчик подключается только к view постов декоратором
+post_image_uploads, остальные загрузки идут обычным путём Django.
+"""
+import io
+from functools import wraps
+
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from django.core.files.uploadhandler import FileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+from core.metrics import upload_bytes
+
+MAX_IMAGE_SIZE: int = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS: int = 40_000_000
+HEADER_LIMIT: int = 256 * 1024
+
+JPEG_APP1 = 0xE1
+JPEG_SOS = 0xDA
+JPEG_STANDALONE = {0x01} | set(range(0xD0, 0xD8))
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class RejectedUpload(InMemoryUploadedFile):
+    """Пустая замена отклонённого файла; причина — в upload_error."""
+
+    def __init__(self, name, content_type, upload_error):
+        super().__init__(io.BytesIO(), 'image', name, content_type, 0, None)
+        self.upload_error = upload_error
+
+
+class ExifStripper:
+    """Потоковый фильтр: копирует сегменты файла, пропуская метаданные.
+
+    Подклассы разбирают заголовок сегмента в read_segment и выставляют
+    state: 'copy' или 'skip' на remaining байт, либо 'data' — дальше
+    поток копируется без разбора.
+    """
+
+    signature_size = 0
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.state = 'signature' if self.signature_size else 'data'
+        self.remaining = 0
+
+    def feed(self, data):
+        self.buffer += data
+        out = bytearray()
+        while self.buffer:
+            if self.state == 'data':
+                out += self.buffer
+                self.buffer.clear()
+            elif self.state in ('copy', 'skip'):
+                size = min(self.remaining, len(self.buffer))
+                if self.state == 'copy':
+                    out += self.buffer[:size]
+                del self.buffer[:size]
+                self.remaining -= size
+                if self.remaining:
+                    break
+                self.state = 'segment'
+            elif self.state == 'signature':
+                if len(self.buffer) < self.signature_size:
+                    break
+                out += self.buffer[:self.signature_size]
+                del self.buffer[:self.signature_size]
+                self.state = 'segment'
+            elif not self.read_segment(out):
+                break
+        return bytes(out)
+
+    def read_segment(self, out):
+        self.state = 'data'
+        return True
+
+    def flush(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class JpegExifStripper(ExifStripper):
+    """Выбрасывает сегменты APP1 (EXIF, XMP) до начала скана."""
+
+    signature_size = 2
+
+    def read_segment(self, out):
+        if len(self.buffer) < 2:
+            return False
+        if self.buffer[0] != 0xFF:
+            self.state = 'data'
+            return True
+        marker = self.buffer[1]
+        if marker == 0xFF:
+            del self.buffer[0]
+        elif marker == JPEG_SOS:
+            self.state = 'data'
+        elif marker in JPEG_STANDALONE:
+            out += self.buffer[:2]
+            del self.buffer[:2]
+        else:
+            if len(self.buffer) < 4:
+                return False
+            self.remaining = int.from_bytes(self.buffer[2:4], 'big') + 2
+            self.state = 'skip' if marker == JPEG_APP1 else 'copy'
+        return True
+
+
+class PngExifStripper(ExifStripper):
+    """Выбрасывает чанки eXIf, идущие до данных изображения."""
+
+    signature_size = len(PNG_SIGNATURE)
+
+    def read_segment(self, out):
+        if len(self.buffer) < 8:
+            return False
+        chunk_type = bytes(self.buffer[4:8])
+        if chunk_type == b'IDAT':
+            self.state = 'data'
+            return True
+        # длина + тип + данные + CRC
+        self.remaining = int.from_bytes(self.buffer[:4], 'big') + 12
+        self.state = 'skip' if chunk_type == b'eXIf' else 'copy'
+        return True
+
+
+STRIPPERS = {
+    'JPEG': JpegExifStripper,
+    'PNG': PngExifStripper,
+}
+
+
+def inspect_header(header):
+    """Формат и размеры картинки по началу файла.
+
+    Возвращает None, если байтов пока мало для разбора заголовка.
+    Image.open читает только заголовок и не декодирует пиксели.
+    """
+    try:
+        with Image.open(io.BytesIO(header)) as image:
+            return image.format, image.size
+    except Image.DecompressionBombError:
+        return 'bomb', (0, 0)
+    except Exception:
+        return None
+
+
+class PostImageUploadHandler(FileUploadHandler):
+    """Обработчик загрузок с ограничением размера и проверкой заголовка.
+
+    Файл сразу пишется на диск, в памяти держится не больше HEADER_LIMIT
+    байт заголовка. Если файл отклонён по ходу приёма, временный файл
+    закрывается, а остальные куски файла пропускаются: прерывать разбор
+    нельзя, иначе пропадут поля, идущие в теле запроса после файла.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra,
+        )
+        self.header = bytearray()
+        self.received = 0
+        self.stripper = None
+        self.upload_error = None
+        self.written = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.written += len(data)
+
+    def reject(self, message):
+        self.upload_error = message
+        self.header = bytearray()
+        self.file.close()
+
+    def check_header(self, final=False):
+        info = inspect_header(bytes(self.header))
+        if info is None:
+            if final or len(self.header) >= HEADER_LIMIT:
+                self.reject(
+                    'Загрузите изображение в формате JPEG, PNG или GIF.'
+                )
+            return False
+        image_format, (width, height) = info
+        if image_format == 'bomb' or width * height > MAX_IMAGE_PIXELS:
+            self.reject('Изображение слишком большое по числу пикселей.')
+            return False
+        self.stripper = STRIPPERS.get(image_format, ExifStripper)()
+        # Хранилище берёт расширение из формата, а не из имени файла.
+        self.file.image_format = image_format
+        self.write(self.stripper.feed(bytes(self.header)))
+        self.header = None
+        return True
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.upload_error:
+            return None
+        if self.received > MAX_IMAGE_SIZE:
+            self.reject(
+                f'Файл больше {MAX_IMAGE_SIZE // (1024 * 1024)} МБ.'
+            )
+        elif self.stripper is None:
+            self.header += raw_data
+            self.check_header()
+        else:
+            self.write(self.stripper.feed(raw_data))
+        return None
+
+    def file_complete(self, file_size):
+        if self.stripper is None and not self.upload_error:
+            self.check_header(final=True)
+        if self.upload_error:
+            upload_bytes.observe(self.received, result='rejected')
+            return RejectedUpload(
+                self.file_name, self.content_type, self.upload_error
+            )
+        self.write(self.stripper.flush())
+        self.file.seek(0)
+        self.file.size = self.written
+        upload_bytes.observe(self.received, result='accepted')
+        return self.file
+
+
+def post_image_uploads(view):
+    """Принимает загрузки view через PostImageUploadHandler.
+
+    Обработчики можно заменить, только пока тело запроса не прочитано,
+    а CsrfViewMiddleware читает его раньше view. Поэтому CSRF
+    проверяется здесь, после замены, как советует документация Django.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [PostImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
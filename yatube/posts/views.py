@@ -1,71 +1,214 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.core.paginator import Paginator
 
+from .caching import FEED_CACHE_TIMEOUT, feed_version
+from .comments import comment_subtree, comment_threads
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import AuthorStats, Comment, Follow, Group, Post, Tag, User
+from .paginators import (CURSOR_FROM_PAGE, CursorPaginator, FeedPaginator,
+                         feed_count_key)
+from .search import SearchResults
+from .tags import mention_posts, tag_posts
+from .thumbnails import enqueue_thumbnail
+from .timeline import (refresh_timeline, timeline_count_key,
+                       timeline_posts)
+from .uploads import post_image_uploads
 
 POSTS_IN_PAGE: int = 10
+COMMENTS_IN_PAGE: int = 20
+
 
+def get_page_obj(request, queryset, count_key=None, **cursor_fields):
+    """Страница ленты: по номеру (?page=) или по курсору (?cursor=).
 
-def get_page_obj(page_number, queryset):
-    paginator = Paginator(queryset, POSTS_IN_PAGE)
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    Номерная страница начиная с CURSOR_FROM_PAGE читается без COUNT(*)
+    и ссылается на соседей курсорами, чтобы листание вглубь не упиралось
+    в OFFSET.
+    """
+    cursor_paginator = CursorPaginator(
+        queryset, POSTS_IN_PAGE, **cursor_fields
+    )
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        return cursor_paginator.get_page(cursor)
+    number = request.GET.get('page')
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        number = 1
+    if number >= CURSOR_FROM_PAGE:
+        return cursor_paginator.get_offset_page(number)
+    paginator = FeedPaginator(
+        cursor_paginator.ordered(), POSTS_IN_PAGE, count_key=count_key,
+        cursor_from_page=CURSOR_FROM_PAGE,
+    )
+    return paginator.get_page(number)
 
 
 def index(request):
-    post_list = Post.objects.all()
-    page_number = request.GET.get('page')
-    page_obj = get_page_obj(page_number, post_list)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = get_page_obj(request, post_list, feed_count_key('index'))
     context = {
         'page_obj': page_obj,
+        'cache_timeout': FEED_CACHE_TIMEOUT,
+        'feed_version': feed_version(('index',)),
     }
     return render(request, 'posts/index.html', context)
 
 
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = get_page_obj(request, posts)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = get_page_obj(
+        request, posts, feed_count_key('group', group.pk)
+    )
     context = {
         'page_obj': page_obj,
         'group': group,
-        'posts': posts
+        'posts': posts,
+        'cache_timeout': FEED_CACHE_TIMEOUT,
+        'feed_version': feed_version(('group', group.pk)),
     }
     return render(request, 'posts/group_list.html', context)
 
 
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('author').all()
-    page_obj = get_page_obj(request, posts)
+    posts = author.posts.select_related('author', 'group')
+    page_obj = get_page_obj(
+        request, posts, feed_count_key('author', author.pk)
+    )
     following = Follow.objects.filter(
         author=author
     ).exists()
     context = {
         'author': author,
+        'stats': AuthorStats.for_user(author),
         'posts': posts,
         'page_obj': page_obj,
         'following': following,
+        'cache_timeout': FEED_CACHE_TIMEOUT,
+        'feed_version': feed_version(('author', author.pk)),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def tag_feed(request, name):
+    tag = get_object_or_404(Tag, name=name.lower())
+    posts = tag_posts(tag).select_related('author', 'group')
+    page_obj = get_page_obj(
+        request, posts, feed_count_key('tag', tag.pk),
+        date_field='feed_date', key_field='feed_key',
+    )
+    context = {
+        'tag': tag,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/tag_list.html', context)
+
+
+def mentions(request, username):
+    author = get_object_or_404(User, username=username)
+    posts = mention_posts(author).select_related('author', 'group')
+    page_obj = get_page_obj(
+        request, posts, feed_count_key('mention', author.pk),
+        date_field='feed_date', key_field='feed_key',
+    )
+    context = {
+        'author': author,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/mentions.html', context)
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    posts_count = post.author.posts.count()
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    posts_count = AuthorStats.for_user(post.author).posts_count
+    comments = get_comments_page(post, request.GET.get('comments'))
+    reply_to = request.GET.get('reply_to', '')
     context = {
         'post': post,
         'posts_count': posts_count,
         'form': CommentForm(),
-        'comments': comments
+        'reply_to': reply_to if reply_to.isdigit() else '',
+        'comments': comments,
+        'cache_timeout': FEED_CACHE_TIMEOUT,
+        'feed_version': feed_version(('post', post.pk)),
+        'comments_version': feed_version(('post_comments', post.pk)),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def get_comments_page(post, cursor=None):
+    return comment_threads(post, cursor, COMMENTS_IN_PAGE)
+
+
+def comment_data(comment):
+    return {
+        'id': comment.pk,
+        'parent': comment.parent_id,
+        'depth': comment.depth,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def comments(request, post_id):
+    """Следующая страница веток комментариев: HTML-фрагмент или JSON."""
+    post = get_object_or_404(Post, pk=post_id)
+    page = get_comments_page(post, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    **comment_data(comment),
+                    'replies': [
+                        comment_data(reply)
+                        for reply in comment.shown_replies
+                    ],
+                    'more_replies': comment.more_replies,
+                }
+                for comment in page
+            ],
+            'next_cursor': page.next_cursor,
+        })
+    context = {'post': post, 'comments': page}
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def comment_thread(request, post_id, comment_id):
+    """Комментарий со всеми ответами: HTML-фрагмент или JSON."""
+    comment = get_object_or_404(
+        Comment.objects.select_related('post'), pk=comment_id, post_id=post_id
+    )
+    subtree = comment_subtree(comment)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(
+            {'comments': [comment_data(reply) for reply in subtree]}
+        )
+    context = {'post': comment.post, 'comment': comment, 'subtree': subtree}
+    return render(request, 'posts/includes/comment_thread.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = FeedPaginator(SearchResults(query), POSTS_IN_PAGE)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@post_image_uploads
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -75,11 +218,13 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        enqueue_thumbnail(post)
         return redirect('posts:profile', request.user.username)
     return render(request, 'posts/post_create.html', {'form': form})
 
 
 @login_required
+@post_image_uploads
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -92,6 +237,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            enqueue_thumbnail(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
@@ -104,22 +251,25 @@ def post_edit(request, post_id):
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
-    form = CommentForm(request.POST or None)
+    form = CommentForm(request.POST or None, post=post)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
         comment.save()
-        return redirect('posts:post_detail', post_id=post_id)
-    return render(request, 'post/post_detail.html', form)
+    return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    list_posts = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author', 'group')
-    page_obj = get_page_obj(request, list_posts)
+    refresh_timeline(request.user.pk)
+    list_posts = timeline_posts(request.user).select_related(
+        'author', 'group'
+    )
+    page_obj = get_page_obj(
+        request, list_posts, timeline_count_key(request.user.pk),
+        date_field='feed_date', key_field='feed_key',
+    )
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
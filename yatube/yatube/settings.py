@@ -35,15 +35,18 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -75,12 +78,45 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# СУБД выбирается переменной окружения YATUBE_DB_ENGINE: sqlite (по
+# умолчанию) или postgresql. Соединения живут YATUBE_DB_CONN_MAX_AGE
+# секунд и перед запросом проверяются (CONN_HEALTH_CHECKS, core.db).
+# PostgreSQL работает через пул core.db.pool: соединения переживают
+# запрос и переходят между потоками, поэтому CONN_MAX_AGE там 0.
+# PRAGMAS выполняются на каждом новом соединении SQLite.
+DB_ENGINE = os.getenv('YATUBE_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.db.backends.postgresql',
+            'NAME': os.getenv('YATUBE_DB_NAME', 'yatube'),
+            'USER': os.getenv('YATUBE_DB_USER', 'yatube'),
+            'PASSWORD': os.getenv('YATUBE_DB_PASSWORD', ''),
+            'HOST': os.getenv('YATUBE_DB_HOST', '127.0.0.1'),
+            'PORT': os.getenv('YATUBE_DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('YATUBE_DB_CONN_MAX_AGE', 0)),
+            'CONN_HEALTH_CHECKS': True,
+            'POOL_SIZE': int(os.getenv('YATUBE_DB_POOL_SIZE', 10)),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv(
+                'YATUBE_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+            ),
+            'CONN_MAX_AGE': int(os.getenv('YATUBE_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'PRAGMAS': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 1024 * 1024,
+                'busy_timeout': 5000,
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -101,12 +137,52 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
-CACHES = {
-    'default': {
+# Общий кэш выбирается переменной окружения YATUBE_CACHE:
+# locmem (по умолчанию), file, db (таблица в БД проекта) или redis.
+# Для всех, кроме locmem, поверх общего кэша работает L1 в памяти процесса.
+CACHE_BACKEND = os.getenv('YATUBE_CACHE', 'locmem')
+CACHE_LOCATION = os.getenv('YATUBE_CACHE_LOCATION')
+
+SHARED_CACHES = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION or os.path.join(BASE_DIR, 'cache'),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': CACHE_LOCATION or 'yatube_cache',
+    },
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': CACHE_LOCATION or 'redis://127.0.0.1:6379/1',
+    },
 }
 
+if CACHE_BACKEND == 'locmem':
+    CACHES = {'default': SHARED_CACHES['locmem']}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'L1_TIMEOUT': int(os.getenv('YATUBE_CACHE_L1_TIMEOUT', 5)),
+                'SYNC_INTERVAL': 1,
+            },
+        },
+        'shared': SHARED_CACHES[CACHE_BACKEND],
+    }
+
+# Оценивать число постов главной ленты по статистике СУБД (PostgreSQL)
+POSTS_APPROXIMATE_COUNT = False
+
+# Бэкенд поиска по постам (путь к классу); None — FTS5 на SQLite,
+# поиск через LIKE на остальных СУБД
+POSTS_SEARCH_BACKEND = None
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
@@ -138,4 +214,34 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Потоки для фоновой подготовки миниатюр; 0 — строить сразу после коммита
+THUMBNAIL_WORKERS = int(os.getenv('YATUBE_THUMBNAIL_WORKERS', 2))
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Доля запросов, которые профилирует core.profiling.ProfilingMiddleware:
+# 0 — только запросы с ?profile, 0.01 — каждый сотый.
+PROFILING_SAMPLE_RATE = float(os.getenv('YATUBE_PROFILING_SAMPLE_RATE', 0))
+
+# Токен Prometheus для /metrics (заголовок Authorization: Bearer <токен>);
+# без токена страница недоступна.
+METRICS_TOKEN = os.getenv('YATUBE_METRICS_TOKEN')
+
+# Каталог, через который воркеры складывают метрики для /metrics;
+# None — только метрики текущего процесса.
+METRICS_DIR = os.getenv('YATUBE_METRICS_DIR')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}